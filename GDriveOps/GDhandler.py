@@ -2,75 +2,575 @@
 from __future__ import print_function
 import os
 import re
-import PyPDF2
 import fitz
 import os.path
-import io
+import time
+import random
+import socket
+import ssl
+import http.client
+import mimetypes
+import threading
+import asyncio
+import json
+import functools
+import itertools
+import zipfile
+from xml.etree.ElementTree import iterparse
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
 from docx import Document
-import configparser
-import nltk
-#from nltk.corpus import stopwords
-#from nltk.tokenize import sent_tokenize, word_tokenize
-#from nltk.stem import WordNetLemmatizer
-import string
-import openai
-from langchain_openai import ChatOpenAI
-import openai
-from groq import Groq
-from langchain.chains import LLMChain, RetrievalQA
-#import time
-#import re
-import warnings
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import HumanMessage
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import ConversationChain
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.runnables.base import Runnable
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
-    MessagesPlaceholder,
-)
-from langchain_core.messages import SystemMessage
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
-import uuid
-from datetime import datetime, timedelta
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.stem import WordNetLemmatizer
-import string
-from langchain.embeddings import HuggingFaceInstructEmbeddings
-#from InstructorEmbedding import INSTRUCTOR
-from sklearn.cluster import KMeans
-import numpy as np
-import voyageai
-from langchain_voyageai import VoyageAIEmbeddings
-from sklearn.metrics.pairwise import cosine_similarity
-from rouge_score import rouge_scorer
-from ipywidgets import widgets
-from IPython.display import display
-
-
-nltk.download('punkt')
-nltk.download('wordnet')
+from .manifest import SyncManifest, file_md5
+from .cache import ExtractionCache, EmbeddingCache, ResponseCache, file_sha256, text_hash
+from .lazy import LazyModule, LazyAttribute
+from .instrument import Instrumentation, JsonlSink, counted
+from .batch import MetadataBatch, BATCH_LIMIT, RETRY_STATUSES
+
+# The summarization stack (NLTK, langchain, LLM/embedding clients, sklearn,
+# notebook widgets) is only imported when first used, so the Drive and file
+# conversion features start quickly and work without it installed.
+np = LazyModule('numpy')
+nltk = LazyModule('nltk')
+voyageai = LazyModule('voyageai')
+tiktoken = LazyModule('tiktoken')
+httpx = LazyModule('httpx')
+WordNetLemmatizer = LazyAttribute('nltk.stem', 'WordNetLemmatizer')
+ChatOpenAI = LazyAttribute('langchain_openai', 'ChatOpenAI')
+ChatGroq = LazyAttribute('langchain_groq', 'ChatGroq')
+LLMChain = LazyAttribute('langchain.chains', 'LLMChain')
+ChatPromptTemplate = LazyAttribute('langchain_core.prompts', 'ChatPromptTemplate')
+HumanMessagePromptTemplate = LazyAttribute('langchain_core.prompts', 'HumanMessagePromptTemplate')
+SystemMessage = LazyAttribute('langchain_core.messages', 'SystemMessage')
+RecursiveCharacterTextSplitter = LazyAttribute('langchain.text_splitter', 'RecursiveCharacterTextSplitter')
+KMeans = LazyAttribute('sklearn.cluster', 'KMeans')
+MiniBatchKMeans = LazyAttribute('sklearn.cluster', 'MiniBatchKMeans')
+threadpool_limits = LazyAttribute('threadpoolctl', 'threadpool_limits')
+widgets = LazyAttribute('ipywidgets', 'widgets')
+display = LazyAttribute('IPython.display', 'display')
+
+LEMMA_CACHE_SIZE = 200000
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+DIGITS_PATTERN = re.compile(r'\d+')
+# Section name -> heading lines that open it, in reading order
+SECTION_HEADINGS = {
+    "methodology": ["methodology", "methods", "method", "materials and methods", "materials & methods"],
+    "results": ["results", "findings"],
+    "discussion": ["discussion", "results and discussion"],
+    "conclusion": ["conclusion", "conclusions", "concluding remarks"],
+}
+STOP_HEADINGS = ["references", "bibliography", "acknowledgements", "acknowledgments"]
+
+NLTK_RESOURCES = {'punkt': 'tokenizers/punkt', 'wordnet': 'corpora/wordnet'}
+_nltk_ready = False
+_nltk_lock = threading.Lock()
+
+def ensure_nltk_data():
+    # Look for the tokenizer/lemmatizer data locally and only download what
+    # is missing, once per process, instead of hitting the network on import.
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    with _nltk_lock:
+        if _nltk_ready:
+            return
+        for package, resource in NLTK_RESOURCES.items():
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package, quiet=True)
+        # The wordnet LazyCorpusLoader replaces itself with the real reader on
+        # first use and is not thread-safe while doing so, so load it here
+        nltk.corpus.wordnet.ensure_loaded()
+        _nltk_ready = True
+
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+# Drive's maximum page size, and the metadata downloads and syncs need
+LIST_PAGE_SIZE = 1000
+LIST_FIELDS = "id, name, size, md5Checksum, mimeType, modifiedTime"
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_RETRIES = 5
+
+EMBEDDING_MODEL = "voyage-large-2-instruct"
+EMBEDDING_BATCH_SIZE = 128
+EMBEDDING_BATCH_TOKENS = 100000
+DEDUP_BLOCK_SIZE = 256
+MINIBATCH_KMEANS_THRESHOLD = 5000
+
+MODEL_PROVIDERS = {
+    "llama3-8b-8192": "groq",
+    "llama3-70b-8192": "groq",
+    "gpt-4o-mini": "openai",
+    "gpt-4o": "openai",
+    "gpt-4": "openai",
+}
+DEFAULT_SUMMARY_PROMPT = "You are a research assistant. Write a concise summary of the methods, results, discussion and conclusions of the following scientific text."
+CHECKPOINT_FILENAME = '.summarize_checkpoint.jsonl'
+# CLI actions that only work on local files and don't need Drive credentials
+LOCAL_ACTIONS = ('convert_pdfs', 'convert_docx', 'summarize_pdfs')
+# CLI actions that transfer files to or from the folder_id argument
+DRIVE_ACTIONS = ('download_pdfs', 'upload_txt', 'download_txts', 'download_docs', 'upload_docs')
+
+# Requests per minute allowed per provider during map-reduce summarization
+PROVIDER_RATE_LIMITS = {"groq": 30, "openai": 500}
+
+MODEL_TEMPERATURES = {"groq": 0.02, "openai": 0}
+# Default request policy for LLM clients; a request that hangs past the
+# timeout is retried by the provider SDK with backoff
+LLM_TIMEOUT = 120.0
+LLM_MAX_RETRIES = 2
+LLM_MAX_CONNECTIONS = 20
+LLM_KEEPALIVE_SECONDS = 60.0
+
+# Context window per model, and what to hold back from it for the system
+# prompt's message framing and the generated summary
+MODEL_CONTEXT_TOKENS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+SUMMARY_OUTPUT_TOKENS = 1024
+MESSAGE_OVERHEAD_TOKENS = 32
+# Used to turn the character-based chunk_size/chunk_overlap options into
+# token budgets, and as the estimate when no tiktoken encoding is available
+CHARS_PER_TOKEN = 4
+TOKEN_COUNT_CACHE_SIZE = 65536
+
+MIME_TYPES = {
+    '.txt': 'text/plain',
+    '.pdf': 'application/pdf',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+def guess_mimetype(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in MIME_TYPES:
+        return MIME_TYPES[extension]
+    return mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+def is_transient_error(error):
+    # Rate limits, server errors and dropped connections are worth retrying;
+    # 403/404 and local errors are not
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRY_STATUSES
+    return isinstance(error, (ConnectionError, TimeoutError, socket.timeout, ssl.SSLError, http.client.HTTPException, httplib2.HttpLib2Error))
+
+def safe_filename(name):
+    # Drive names are free text: they can contain path separators, a drive
+    # letter or be '..'. Map them to a single local path component.
+    name = os.path.splitdrive(name)[1]
+    for sep in (os.sep, os.altsep):
+        if sep:
+            name = name.replace(sep, '_')
+    if name in ('', '.', '..'):
+        name = '_' * max(len(name), 1)
+    return name
+
+# Module-level helpers so they can be pickled into worker processes
+def iter_pdf_pages(pdf_path, start=0, stop=None, max_pages=None):
+    # Yields one page of text at a time; the document is closed when the
+    # generator is exhausted or discarded.
+    with fitz.open(pdf_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        if max_pages is not None:
+            stop = min(stop, start + max_pages)
+        for page_number in range(start, stop):
+            yield doc[page_number].get_text()
+
+def pdf_text_range(pdf_path, start=0, stop=None):
+    return ''.join(iter_pdf_pages(pdf_path, start=start, stop=stop))
+
+def write_pages_atomic(output_path, pages):
+    # Readers only ever see a complete file. If pages raises (e.g. a failed
+    # page range) the temporary file is removed and output_path is untouched.
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as text_file:
+            for page_text in pages:
+                text_file.write(page_text)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def convert_pdf_job(pdf_path, output_path):
+    write_pages_atomic(output_path, iter_pdf_pages(pdf_path))
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+# Run content other than w:t and its text, as python-docx renders it
+DOCX_RUN_TEXT = {
+    WORD_NAMESPACE + 'tab': '\t',
+    WORD_NAMESPACE + 'ptab': '\t',
+    WORD_NAMESPACE + 'cr': '\n',
+    WORD_NAMESPACE + 'noBreakHyphen': '-',
+}
+
+def iter_docx_paragraphs(docx_path):
+    # Streams word/document.xml out of the archive and yields one line per
+    # paragraph in document order, without building python-docx's object
+    # model. Table rows become one line with the cells separated by tabs.
+    # Text boxes are w:p elements nested inside a run of another paragraph;
+    # their lines follow the paragraph that anchors them.
+    paragraph_tag = WORD_NAMESPACE + 'p'
+    run_tag = WORD_NAMESPACE + 'r'
+    text_tag = WORD_NAMESPACE + 't'
+    break_tag = WORD_NAMESPACE + 'br'
+    break_type = WORD_NAMESPACE + 'type'
+    row_tag = WORD_NAMESPACE + 'tr'
+    cell_tag = WORD_NAMESPACE + 'tc'
+    textbox_tag = WORD_NAMESPACE + 'txbxContent'
+    # Open paragraphs as [text parts, run depth, text box lines]
+    paragraphs = []
+    rows = []
+    # Lines collected by the innermost open table cell or text box
+    containers = []
+    skip_depth = 0
+    with zipfile.ZipFile(docx_path) as archive, archive.open('word/document.xml') as xml_file:
+        for event, elem in iterparse(xml_file, events=('start', 'end')):
+            tag = elem.tag
+            # mc:Fallback repeats the mc:Choice content (e.g. a VML copy of a
+            # text box) for older readers
+            if tag == MC_FALLBACK:
+                skip_depth += 1 if event == 'start' else -1
+                continue
+            if skip_depth:
+                continue
+            if event == 'start':
+                if tag == run_tag:
+                    paragraphs[-1][1] += 1
+                elif tag == paragraph_tag:
+                    paragraphs.append([[], 0, []])
+                elif tag == row_tag:
+                    rows.append([])
+                elif tag in (cell_tag, textbox_tag):
+                    containers.append([])
+                continue
+            if tag == paragraph_tag:
+                parts, _, boxes = paragraphs.pop()
+                lines = [''.join(parts)] + boxes
+                elem.clear()
+            elif tag == row_tag:
+                lines = ['\t'.join(rows.pop())]
+                elem.clear()
+            else:
+                if tag == run_tag:
+                    paragraphs[-1][1] -= 1
+                elif tag == cell_tag:
+                    rows[-1].append(' '.join(containers.pop()))
+                elif tag == textbox_tag:
+                    paragraphs[-1][2].extend(containers.pop())
+                elif paragraphs and paragraphs[-1][1]:
+                    # Tabs etc. only count inside runs; w:tab is also a tab stop
+                    # definition in paragraph properties
+                    parts = paragraphs[-1][0]
+                    if tag == text_tag:
+                        if elem.text:
+                            parts.append(elem.text)
+                    elif tag == break_tag:
+                        # Page and column breaks have no text equivalent
+                        if elem.get(break_type, 'textWrapping') == 'textWrapping':
+                            parts.append('\n')
+                    elif tag in DOCX_RUN_TEXT:
+                        parts.append(DOCX_RUN_TEXT[tag])
+                continue
+            if containers:
+                containers[-1].extend(lines)
+            else:
+                yield from lines
+
+def convert_docx_job(docx_path, output_path):
+    write_pages_atomic(output_path, ['\n'.join(iter_docx_paragraphs(docx_path))])
+
+class RateLimiter:
+    # Spaces requests evenly to stay under a requests-per-minute budget. Slots
+    # are reserved under a thread lock so one limiter can be shared by event
+    # loops running on different threads.
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        return slot - now
+
+    async def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def run_coroutine(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Already inside an event loop (e.g. a Jupyter widget callback)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+_token_encoders = {}
+_token_encoders_lock = threading.Lock()
+
+def get_token_encoder(model):
+    # tiktoken has no Llama vocabulary, so models it doesn't know are counted
+    # with cl100k_base, which is close enough for budgeting. Returns None when
+    # no encoding can be loaded (tiktoken fetches them on first use).
+    with _token_encoders_lock:
+        if model in _token_encoders:
+            return _token_encoders[model]
+        try:
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoder = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            print(f"No tiktoken encoding available for {model} ({e}); estimating tokens from text length.")
+            encoder = None
+        _token_encoders[model] = encoder
+        return encoder
+
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def count_tokens(text, model):
+    # Chunks are counted again by the splitter, the packer and the reduce
+    # step, so counts are memoized per (text digest, model); the LRU keeps
+    # digests rather than pinning the chunk text itself
+    key = (text_hash(text), model)
+    with _token_counts_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            return _token_counts[key]
+    encoder = get_token_encoder(model)
+    if encoder is None:
+        tokens = len(text) // CHARS_PER_TOKEN + 1
+    else:
+        tokens = len(encoder.encode(text, disallowed_special=()))
+    with _token_counts_lock:
+        _token_counts[key] = tokens
+        if len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return tokens
+
+def clear_token_counts():
+    with _token_counts_lock:
+        _token_counts.clear()
+
+_lemmatizer = None
+
+def get_lemmatizer():
+    # Built once per process and shared by every thread
+    global _lemmatizer
+    if _lemmatizer is None:
+        ensure_nltk_data()
+        with _nltk_lock:
+            if _lemmatizer is None:
+                _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word(word):
+    # Natural text repeats a small vocabulary, so WordNet lookups are memoized
+    return get_lemmatizer().lemmatize(word)
+
+def preprocess_document(text, tokenizer='nltk'):
+    # tokenizer='nltk' matches the sentence/word tokenization used so far;
+    # tokenizer='regex' takes runs of letters in a single pass, which is much
+    # faster but splits contractions differently.
+    if tokenizer == 'regex':
+        return ' '.join(lemmatize_word(word) for word in WORD_PATTERN.findall(text.lower()))
+    elif tokenizer != 'nltk':
+        raise ValueError(f"Invalid tokenizer: {tokenizer}")
+
+    ensure_nltk_data()
+    processed_sentences = []
+    for sent in nltk.sent_tokenize(text):
+        processed_sentences.append(' '.join(
+            lemmatize_word(word.lower())
+            for word in nltk.word_tokenize(sent)
+            if word.isalpha()
+        ))
+    processed_text = ' '.join(processed_sentences)
+    return DIGITS_PATTERN.sub('', processed_text)
+
+class SectionSpans(Mapping):
+    # Section boundaries as (start, end) offsets into the original text. The
+    # section strings are only sliced out when a section is read.
+    def __init__(self, text, spans):
+        self.text = text
+        self.spans = spans
+
+    def __getitem__(self, name):
+        return ''.join(self.text[start:end] for start, end in self.spans[name])
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def combined(self):
+        return ''.join(self[name] for name in self.spans)
+
+@functools.lru_cache(maxsize=32)
+def compile_section_headings(headings, stop_headings):
+    names = {}
+    for section, words in headings:
+        for word in words:
+            names[' '.join(word.lower().split())] = section
+    for word in stop_headings:
+        names[' '.join(word.lower().split())] = None
+    alternation = '|'.join(
+        r'[ \t]+'.join(re.escape(part) for part in word.split())
+        for word in sorted(names, key=len, reverse=True)
+    )
+    # A heading is a whole line: optional numbering ("2.", "3.1", "IV."),
+    # the heading itself and an optional colon
+    pattern = re.compile(
+        rf'^[ \t]*(?:(?:\d+(?:\.\d+)*|[IVXivx]+)[.)]?[ \t]+)?(?P<heading>{alternation})[ \t]*:?[ \t]*$',
+        re.IGNORECASE | re.MULTILINE
+    )
+    return pattern, names
+
+def segment_sections(text, headings=None, stop_headings=None):
+    headings = SECTION_HEADINGS if headings is None else headings
+    stop_headings = STOP_HEADINGS if stop_headings is None else stop_headings
+    pattern, names = compile_section_headings(
+        tuple((section, tuple(words)) for section, words in headings.items()),
+        tuple(stop_headings)
+    )
+    order = {section: rank for rank, section in enumerate(headings)}
+    spans = {section: [] for section in headings}
+    current = None
+    current_rank = -1
+    start = 0
+    for match in pattern.finditer(text):
+        section = names[' '.join(match.group('heading').lower().split())]
+        # Sections only move forward, so e.g. a "Results" line inside the
+        # discussion doesn't restart the results section
+        if section is not None and order[section] < current_rank:
+            continue
+        if current is not None:
+            spans[current].append((start, match.start()))
+        current = section
+        start = match.start()
+        if section is not None:
+            current_rank = order[section]
+    if current is not None:
+        spans[current].append((start, len(text)))
+    return SectionSpans(text, spans)
+
+def unique_representatives(distances):
+    # Pick the closest chunk to each cluster center without reusing a chunk.
+    # Clusters with the tightest best match choose first, so a contested chunk
+    # goes to the center it is nearest to.
+    order = np.argsort(distances, axis=0)
+    taken = np.zeros(distances.shape[0], dtype=bool)
+    selected = []
+    for cluster in np.argsort(distances.min(axis=0)):
+        for index in order[:, cluster]:
+            if not taken[index]:
+                taken[index] = True
+                selected.append(int(index))
+                break
+    return selected
+
+def k_center_greedy(vectors, k):
+    # Farthest-point traversal starting from the chunk nearest the centroid
+    start = int(np.argmin(np.linalg.norm(vectors - vectors.mean(axis=0), axis=1)))
+    selected = [start]
+    min_distances = np.linalg.norm(vectors - vectors[start], axis=1)
+    min_distances[start] = -1
+    while len(selected) < k:
+        index = int(np.argmax(min_distances))
+        selected.append(index)
+        min_distances = np.minimum(min_distances, np.linalg.norm(vectors - vectors[index], axis=1))
+        min_distances[selected] = -1
+    return selected
+
+def dedup_indices(vectors, similarity_threshold=0.8, block_size=DEDUP_BLOCK_SIZE):
+    # Greedy near-duplicate removal: a vector is kept when its cosine
+    # similarity to every previously kept vector is below the threshold.
+    # Vectors are normalized once into float32 and kept ones are written into
+    # a preallocated matrix. Each block of candidates is checked against the
+    # kept set with one matrix product, and only the survivors are compared
+    # one by one against vectors kept earlier in the same block.
+    matrix = np.asarray(vectors, dtype=np.float32)
+    n = len(matrix)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix = matrix / norms
+
+    kept = np.empty_like(matrix)
+    kept_indices = np.empty(n, dtype=np.intp)
+    count = 0
+    for start in range(0, n, block_size):
+        block = matrix[start:start + block_size]
+        if count:
+            candidates = np.flatnonzero((block @ kept[:count].T).max(axis=1) < similarity_threshold)
+        else:
+            candidates = np.arange(len(block))
+        block_count = count
+        for j in candidates:
+            vector = block[j]
+            if count > block_count and (kept[block_count:count] @ vector).max() >= similarity_threshold:
+                continue
+            kept[count] = vector
+            kept_indices[count] = start + j
+            count += 1
+    return kept_indices[:count]
+
 
 class GoogleDriveHandler:
-    def __init__(self, credentials_path='credentials.json', token_path='token.json'):
+    def __init__(self, credentials_path='credentials.json', token_path='token.json', folder_index_ttl=0, llm_timeout=LLM_TIMEOUT, llm_max_retries=LLM_MAX_RETRIES, instrumentation=None, connect=True):
         self.SCOPES = ['https://www.googleapis.com/auth/drive']
         self.credentials_path = credentials_path
         self.token_path = token_path
-        self.service = self.create_service()
+        self.folder_index_ttl = folder_index_ttl
+        self.creds = None
+        self._local = threading.local()
+        self._folder_index_cache = {}
+        self._folder_index_lock = threading.Lock()
+        self._voyage_clients = {}
+        self._voyage_lock = threading.Lock()
+        self.rate_limits = dict(PROVIDER_RATE_LIMITS)
+        self._rate_limiters = {}
+        self._rate_limiter_lock = threading.Lock()
+        self.llm_timeout = llm_timeout
+        self.llm_max_retries = llm_max_retries
+        self._http_client = None
+        self._http_async_client = None
+        self._llm_clients = {}
+        self._chains = {}
+        self._llm_lock = threading.Lock()
+        self._list_executor = None
+        self._list_executor_lock = threading.Lock()
+        # Spans and counters from every stage; see GDriveOps.instrument
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        # connect=False skips Drive authentication for local-only work such as
+        # conversion and summarization
+        self.service = self.create_service() if connect else None
+        self._local.service = self.service
 
     def create_service(self):
         creds = None
@@ -103,403 +603,1064 @@ class GoogleDriveHandler:
             with open(self.token_path, 'w') as token:
                 token.write(creds.to_json())
 
+        self.creds = creds
+        return self.build_service()
+
+    def build_service(self):
         try:
-            service = build('drive', 'v3', credentials=creds)
+            service = build('drive', 'v3', credentials=self.creds)
         except Exception as e:
             raise RuntimeError(f"Failed to create the Google Drive service: {e}")
 
         return service
 
+    def get_service(self):
+        # googleapiclient service objects are not thread-safe, so each worker
+        # thread gets its own service (and HTTP connection) on first use.
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            if self.service is None:
+                raise RuntimeError("This handler was created with connect=False and cannot reach Google Drive")
+            service = self.build_service()
+            self._local.service = service
+        return service
+
     def ensure_directory(self, path):
         if not os.path.exists(path):
             os.makedirs(path)
 
-    def get_files_in_folder(self, folder_id, mimeType, page_size=10):
-        query = f"'{folder_id}' in parents and mimeType='{mimeType}' and trashed=false"
-        files = []
-        page_token = None
-        while True:
-            results = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token,
-                pageSize=page_size
-            ).execute()
-            files.extend(results.get('files', []))
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
-        return files
+    def get_list_executor(self):
+        # One long-lived thread fetches list pages ahead of the consumer. It
+        # keeps its own Drive service, so it never shares an HTTP connection
+        # with the thread that is downloading the current page.
+        with self._list_executor_lock:
+            if self._list_executor is None:
+                self._list_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gdriveops-list')
+            return self._list_executor
+
+    def iter_query(self, query, page_size=LIST_PAGE_SIZE, fields=f"nextPageToken, files({LIST_FIELDS})"):
+        # Lazily yields the files matching query. The next page is requested
+        # as soon as the current one arrives, so listing overlaps with whatever
+        # the caller does with the items.
+        executor = self.get_list_executor()
+
+        def fetch(page_token):
+            with self.instrumentation.span('list') as span:
+                results = self.get_service().files().list(
+                    q=query,
+                    spaces='drive',
+                    fields=fields,
+                    pageToken=page_token,
+                    pageSize=page_size
+                ).execute()
+                span['files'] = len(results.get('files', []))
+            return results
+
+        future = executor.submit(fetch, None)
+        while future is not None:
+            results = future.result()
+            page_token = results.get('nextPageToken')
+            future = executor.submit(fetch, page_token) if page_token else None
+            for item in results.get('files', []):
+                yield item
+
+    def iter_folder(self, folder_id, mime_types=None, recursive=False, page_size=LIST_PAGE_SIZE, fields=LIST_FIELDS):
+        # Yields the files of a folder as pages arrive. With recursive=True
+        # subfolders are walked too; their items carry 'folder_path', the path
+        # of the subfolder relative to folder_id.
+        fields = f"nextPageToken, files({fields})"
+        mime_filter = ''
+        if mime_types:
+            wanted = list(mime_types) + ([FOLDER_MIMETYPE] if recursive else [])
+            mime_filter = " and (" + ' or '.join(f"mimeType='{mime_type}'" for mime_type in wanted) + ")"
+        pending = []
+        visited = {folder_id}
+
+        def expand(items, folder_path):
+            for item in items:
+                if recursive and item.get('mimeType') == FOLDER_MIMETYPE:
+                    # Files can have several parents, so guard against cycles
+                    if item['id'] not in visited:
+                        visited.add(item['id'])
+                        pending.append((item['id'], os.path.join(folder_path, safe_filename(item['name'])), None))
+                    continue
+                if recursive:
+                    item['folder_path'] = folder_path
+                yield item
+
+        query = f"'{folder_id}' in parents and trashed=false" + mime_filter
+        yield from expand(self.iter_query(query, page_size=page_size, fields=fields), '')
 
-    def get_files_in_folder_with_query(self, query, page_size=10):
-        query += " and trashed=false"
-        files = []
-        page_token = None
+        # Subfolders are usually small, so rather than one list call each, the
+        # next page of up to BATCH_LIMIT of them is fetched per round trip
+        while pending:
+            current = pending[:BATCH_LIMIT]
+            del pending[:BATCH_LIMIT]
+            files = self.get_service().files()
+            requests = [
+                files.list(q=f"'{subfolder_id}' in parents and trashed=false" + mime_filter, spaces='drive', fields=fields, pageToken=page_token, pageSize=page_size)
+                for subfolder_id, folder_path, page_token in current
+            ]
+            for (subfolder_id, folder_path, page_token), results in zip(current, self.execute_batch(requests)):
+                if isinstance(results, Exception):
+                    raise results
+                self.instrumentation.count('list', 'files', len(results.get('files', [])))
+                if results.get('nextPageToken'):
+                    pending.append((subfolder_id, folder_path, results['nextPageToken']))
+                yield from expand(results.get('files', []), folder_path)
+
+    def execute_batch(self, requests):
+        # Sends metadata requests BATCH_LIMIT per round trip and returns their
+        # responses in order; a call that failed is returned as its HttpError.
+        batch = MetadataBatch(self.get_service(), instrumentation=self.instrumentation)
+        for request in requests:
+            batch.add(request)
+        return batch.execute()
+
+    def get_metadata(self, file_ids, fields=LIST_FIELDS):
+        # Bulk lookup by file ID; files that no longer exist map to None
+        file_ids = list(file_ids)
+        files = self.get_service().files()
+        results = self.execute_batch([files.get(fileId=file_id, fields=fields) for file_id in file_ids])
+        metadata = {}
+        for file_id, result in zip(file_ids, results):
+            if isinstance(result, HttpError):
+                if result.resp.status != 404:
+                    raise result
+                result = None
+            metadata[file_id] = result
+        return metadata
+
+    def get_files_in_folder(self, folder_id, mimeType, page_size=LIST_PAGE_SIZE):
+        return list(self.iter_folder(folder_id, mime_types=[mimeType], page_size=page_size))
+
+    def get_files_in_folder_with_query(self, query, page_size=LIST_PAGE_SIZE, fields=f"nextPageToken, files({LIST_FIELDS})"):
+        return list(self.iter_query(query + " and trashed=false", page_size=page_size, fields=fields))
+
+    def download_folder(self, folder_id, save_dir, mime_types, limit=None, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, recursive=False):
+        # Downloads start while the folder is still being listed
+        self.ensure_directory(save_dir)
+        items = self.iter_folder(folder_id, mime_types=mime_types, recursive=recursive)
+        if limit is not None:
+            items = itertools.islice(items, limit)
+        return self.download_items(items, save_dir, workers=workers, chunk_size=chunk_size)
+
+    def download_file(self, item, save_dir, verbose=True, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=3, overwrite=False):
+        file_name = safe_filename(item['name'])
+        root = os.path.realpath(save_dir)
+        if item.get('folder_path'):
+            save_dir = os.path.join(save_dir, item['folder_path'])
+        file_path = os.path.join(save_dir, file_name)
+        # Also catches symlinks inside save_dir that point elsewhere
+        if os.path.commonpath([root, os.path.realpath(file_path)]) != root:
+            raise ValueError(f"Refusing to write {file_path} outside {root}")
+        os.makedirs(save_dir, exist_ok=True)
+        if os.path.exists(file_path) and not overwrite:
+            if verbose:
+                print(f"{file_name} already exists. Skipping download.")
+            return False
+
+        if verbose:
+            print(f"Downloading {file_name}...")
+        # Chunks are streamed into a partial file next to the target and only
+        # renamed into place once complete, so readers never see a truncated file.
+        # The partial file carries the Drive ID, so same-named files never share it.
+        part_path = f"{file_path}.{item['id']}.part"
+        meta_path = part_path + '.json'
+        version = {key: item.get(key) for key in ('id', 'size', 'md5Checksum', 'modifiedTime')}
+        size = int(item['size']) if item.get('size') else None
+        if os.path.exists(part_path):
+            # Only resume a partial file of the same remote version; otherwise
+            # the old prefix would be joined to the new content
+            resumable = False
+            if item.get('md5Checksum') or item.get('modifiedTime'):
+                try:
+                    with open(meta_path, encoding='utf-8') as f:
+                        resumable = json.load(f) == version
+                except (OSError, ValueError):
+                    pass
+            if not resumable or (size is not None and os.path.getsize(part_path) > size):
+                os.remove(part_path)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(version, f)
+
+        attempt = 0
+        with self.instrumentation.span('download', file=file_name) as span:
+            while True:
+                try:
+                    self.stream_to_file(item['id'], part_path, chunk_size=chunk_size, verbose=verbose, size=size)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    span['retries'] = attempt
+                    if attempt > retries or not is_transient_error(e):
+                        raise
+                    delay = min(2 ** (attempt - 1) + random.random(), 32)
+                    if verbose:
+                        print(f"Retrying {file_name} in {delay:.1f}s ({attempt}/{retries}) after error: {e}")
+                    time.sleep(delay)
+            if item.get('md5Checksum') and file_md5(part_path) != item['md5Checksum']:
+                os.remove(part_path)
+                os.remove(meta_path)
+                raise ValueError(f"Checksum mismatch for {file_name}; the partial download was discarded")
+            os.replace(part_path, file_path)
+            os.remove(meta_path)
+            span['bytes'] = os.path.getsize(file_path)
+        return True
+
+    def stream_to_file(self, file_id, part_path, chunk_size=DOWNLOAD_CHUNK_SIZE, verbose=True, size=None):
+        # Requests the file in "Range: bytes=a-b" chunks starting after the
+        # bytes already in part_path, so an interrupted download resumes where
+        # it stopped. A part that is already size bytes long is left as is.
+        request = self.get_service().files().get_media(fileId=file_id)
+        with open(part_path, 'ab') as fh:
+            offset = fh.tell()
+            while size is None or offset < size:
+                headers = dict(request.headers, range=f'bytes={offset}-{offset + chunk_size - 1}')
+                response, content = request.http.request(request.uri, 'GET', headers=headers)
+                content_range = response.get('content-range', '')
+                if response.status == 416 and content_range.endswith(f'/{offset}'):
+                    break
+                if response.status not in (200, 206):
+                    raise HttpError(response, content, uri=request.uri)
+                if response.status == 200:
+                    # The server ignored the range and sent the whole file
+                    fh.seek(0)
+                    fh.truncate()
+                    offset = 0
+                    size = len(content)
+                elif '/' in content_range and not content_range.endswith('/*'):
+                    size = int(content_range.rsplit('/', 1)[1])
+                fh.write(content)
+                offset += len(content)
+                if verbose:
+                    print(f"Download {int(offset / size * 100) if size else 100}%.")
+                if not content:
+                    break
+
+    def download_items(self, items, save_dir, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, overwrite=False):
+        # items may be a lazy iterator (see iter_folder); downloads are
+        # submitted as items arrive and the total is only known for lists.
+        # Results are keyed by Drive file ID, since names need not be unique.
+        total = len(items) if hasattr(items, '__len__') else None
+        results = {'downloaded': [], 'skipped': [], 'failed': {}}
+        lock = threading.Lock()
+        verbose = workers <= 1
+
+        def unique(items):
+            # Drive allows several files with one name in a folder; the first
+            # listed wins, so concurrent workers never write the same target
+            seen = set()
+            for item in items:
+                file_name = os.path.join(item.get('folder_path', ''), safe_filename(item['name']))
+                if file_name in seen:
+                    with lock:
+                        results['skipped'].append(item['id'])
+                    print(f"Skipping {file_name} ({item['id']}): another file with the same name is already being downloaded")
+                    continue
+                seen.add(file_name)
+                yield item
+
+        def fetch(item):
+            file_name = os.path.join(item.get('folder_path', ''), safe_filename(item['name']))
+            try:
+                downloaded = self.download_file(item, save_dir, verbose=verbose, chunk_size=chunk_size, overwrite=overwrite)
+            except Exception as e:
+                # Isolate failures so one bad file doesn't abort the batch
+                with lock:
+                    results['failed'][item['id']] = str(e)
+                print(f"Failed to download {file_name}: {e}")
+                return
+            with lock:
+                results['downloaded' if downloaded else 'skipped'].append(item['id'])
+                finished = len(results['downloaded']) + len(results['skipped']) + len(results['failed'])
+            if not verbose:
+                progress = finished if total is None else f"{finished}/{total}"
+                print(f"[{progress}] {'Downloaded' if downloaded else 'Skipped'} {file_name}")
+
+        if workers <= 1:
+            for item in unique(items):
+                fetch(item)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(fetch, unique(items)))
+
+        finished = len(results['downloaded']) + len(results['skipped']) + len(results['failed'])
+        print(f"Downloaded {len(results['downloaded'])}, skipped {len(results['skipped'])}, failed {len(results['failed'])} of {finished} files.")
+        return results
+
+    def sync_folder(self, folder_id, save_dir, mime_types, limit=None, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, recursive=False):
+        # Incremental download: the manifest remembers what was fetched, and the
+        # Drive Changes API token lets later runs ask only for what changed since.
+        # Changes are matched by direct parent, so subfolders are not synced.
+        if recursive:
+            raise ValueError("sync does not support recursive downloads; use one or the other")
+        self.ensure_directory(save_dir)
+        token_key = f'start_page_token:{folder_id}'
+        with SyncManifest(save_dir) as manifest:
+            token = manifest.get_state(token_key)
+            if token:
+                candidates, new_token = self.list_folder_changes(folder_id, token, mime_types, manifest)
+            else:
+                new_token = self.get_service().changes().getStartPageToken().execute().get('startPageToken')
+                candidates = list(self.iter_folder(folder_id, mime_types=mime_types))
+
+            items = []
+            for item in candidates:
+                local_path = os.path.join(save_dir, safe_filename(item['name']))
+                if manifest.is_current(item) and os.path.exists(local_path):
+                    continue
+                # Adopt files that are already on disk from a pre-manifest run
+                if (item.get('md5Checksum') and os.path.exists(local_path)
+                        and file_md5(local_path) == item['md5Checksum']):
+                    manifest.record(item, folder_id)
+                    continue
+                items.append(item)
+            if limit is not None:
+                items = items[:limit]
+
+            print(f"{len(items)} of {len(candidates)} files changed since the last sync.")
+            results = self.download_items(items, save_dir, workers=workers, chunk_size=chunk_size, overwrite=True)
+            downloaded = set(results['downloaded'])
+            for item in items:
+                if item['id'] in downloaded:
+                    manifest.record(item, folder_id)
+            # Only advance the token when nothing failed, so failures are retried next run
+            if not results['failed'] and (limit is None or len(items) < limit):
+                manifest.set_state(token_key, new_token)
+        return results
+
+    def list_folder_changes(self, folder_id, page_token, mime_types, manifest):
+        changed = {}
         while True:
-            results = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields="nextPageToken, files(id, name)",
+            results = self.get_service().changes().list(
                 pageToken=page_token,
-                pageSize=page_size
+                spaces='drive',
+                pageSize=1000,
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, md5Checksum, modifiedTime, size, parents, trashed))"
             ).execute()
-            files.extend(results.get('files', []))
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
-        return files
+            for change in results.get('changes', []):
+                item = change.get('file')
+                if change.get('removed') or not item or item.get('trashed'):
+                    manifest.remove(change['fileId'])
+                    changed.pop(change['fileId'], None)
+                elif folder_id in item.get('parents', []) and item.get('mimeType') in mime_types:
+                    changed[item['id']] = item
+            if 'newStartPageToken' in results:
+                return list(changed.values()), results['newStartPageToken']
+            page_token = results['nextPageToken']
 
-    def download_file(self, item, save_dir):
-        file_name = item['name']
-        if not os.path.exists(os.path.join(save_dir, file_name)):
-            print(f"Downloading {file_name}...")
-            request = self.service.files().get_media(fileId=item['id'])
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                print(f"Download {int(status.progress() * 100)}%.")
-            with open(os.path.join(save_dir, file_name), 'wb') as f:
-                fh.seek(0)
-                f.write(fh.read())
-        else:
-            print(f"{file_name} already exists. Skipping download.")
+    def get_folder_index(self, folder_id, ttl=None):
+        # Name/md5 lookup tables for a remote folder. With a TTL the index is
+        # cached in-process so repeated uploads into one folder list it once.
+        ttl = self.folder_index_ttl if ttl is None else ttl
+        with self._folder_index_lock:
+            cached = self._folder_index_cache.get(folder_id)
+            if cached and ttl and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+
+        index = {'by_name': {}, 'by_md5': {}}
+        for file in self.iter_folder(folder_id):
+            index['by_name'][file['name']] = file
+            if file.get('md5Checksum'):
+                index['by_md5'][file['md5Checksum']] = file
+
+        if ttl:
+            with self._folder_index_lock:
+                self._folder_index_cache[folder_id] = (time.monotonic(), index)
+        return index
+
+    def add_to_folder_index(self, folder_id, file):
+        with self._folder_index_lock:
+            cached = self._folder_index_cache.get(folder_id)
+            if cached:
+                cached[1]['by_name'][file['name']] = file
+                if file.get('md5Checksum'):
+                    cached[1]['by_md5'][file['md5Checksum']] = file
+
+    def invalidate_folder_index(self, folder_id=None):
+        with self._folder_index_lock:
+            if folder_id is None:
+                self._folder_index_cache.clear()
+            else:
+                self._folder_index_cache.pop(folder_id, None)
 
     def get_existing_files(self, folder_id):
-        existing_files = self.service.files().list(
-            q=f"'{folder_id}' in parents and trashed=false",
-            spaces='drive',
-            fields='nextPageToken, files(id, name)'
-        ).execute()
-        return [file['name'] for file in existing_files.get('files', [])]
-
-    def upload_file(self, file_name, folder_id, directory_path):
+        return list(self.get_folder_index(folder_id)['by_name'])
+
+    def media_for(self, file_path):
+        mimetype = guess_mimetype(file_path)
+        # Large files go up as resumable chunked uploads so a dropped
+        # connection only costs the current chunk, not the whole file.
+        if os.path.getsize(file_path) > RESUMABLE_UPLOAD_THRESHOLD:
+            return MediaFileUpload(file_path, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+        return MediaFileUpload(file_path, mimetype=mimetype)
+
+    def execute_upload(self, request, retries=UPLOAD_RETRIES):
+        # num_retries makes googleapiclient retry 429/5xx responses with
+        # randomized exponential backoff.
+        if request.resumable is None:
+            return request.execute(num_retries=retries)
+        response = None
+        while response is None:
+            status, response = request.next_chunk(num_retries=retries)
+        return response
+
+    def upload_file(self, file_name, folder_id, directory_path, verbose=True, retries=UPLOAD_RETRIES):
         file_path = os.path.join(directory_path, file_name)
         file_metadata = {'name': file_name, 'parents': [folder_id]}
-        media = MediaFileUpload(file_path, mimetype='text/plain')
-        file = self.service.files().create(
+        request = self.get_service().files().create(
             body=file_metadata,
-            media_body=media,
+            media_body=self.media_for(file_path),
             fields='id'
-        ).execute()
-        print(f"{file_name} uploaded successfully with File ID: {file.get('id')}")
+        )
+        with self.instrumentation.span('upload', file=file_name) as span:
+            file = self.execute_upload(request, retries=retries)
+            span['bytes'] = os.path.getsize(file_path)
+        if verbose:
+            print(f"{file_name} uploaded successfully with File ID: {file.get('id')}")
+        self.add_to_folder_index(folder_id, {'id': file.get('id'), 'name': file_name})
+        return file.get('id')
 
-    def download_pdfs(self, folder_id, save_dir='PDF_docs', limit = None):
-        self.ensure_directory(save_dir)
-        page_token = None
-        downloaded_files = 0
-        while True:
-            results = self.service.files().list(
-                q=f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false",
-                spaces='drive',
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token,
-                pageSize=10
-            ).execute()
-            items = results.get('files', [])
-            if not items:
-                print('No more files found.')
-                break
-            for item in items:
-                if limit is not None and downloaded_files >= limit:
-                    print(f"Download limit of {limit} files reached.")
-                    return
-                self.download_file(item, save_dir)
-                downloaded_files += 1
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
+    def update_file(self, file_id, file_name, directory_path, verbose=True, retries=UPLOAD_RETRIES):
+        file_path = os.path.join(directory_path, file_name)
+        request = self.get_service().files().update(
+            fileId=file_id,
+            media_body=self.media_for(file_path),
+            fields='id'
+        )
+        with self.instrumentation.span('upload', file=file_name) as span:
+            self.execute_upload(request, retries=retries)
+            span['bytes'] = os.path.getsize(file_path)
+        if verbose:
+            print(f"{file_name} updated successfully with File ID: {file_id}")
+        return file_id
+
+    def verify_uploads(self, results, directory_path, checksums=None):
+        # Compares the md5 Drive stored for each uploaded file with the local
+        # file; the metadata is fetched in batches. Files that don't match are
+        # moved from 'uploaded' to 'failed' so they are retried next time.
+        uploaded = results['uploaded']
+        if not uploaded:
+            return results
+        checksums = checksums or {}
+        remote = self.get_metadata(uploaded.values(), fields='id, md5Checksum')
+        for file_name, file_id in list(uploaded.items()):
+            md5 = checksums.get(file_name) or file_md5(os.path.join(directory_path, file_name))
+            remote_md5 = (remote.get(file_id) or {}).get('md5Checksum')
+            if remote_md5 != md5:
+                del uploaded[file_name]
+                error = 'not found after upload' if remote.get(file_id) is None else f'checksum mismatch (local {md5}, remote {remote_md5})'
+                results['failed'][file_name] = error
+                print(f"Verification failed for {file_name}: {error}")
+        return results
+
+    def upload_items(self, tasks, folder_id, directory_path, workers=1, verify=False):
+        # tasks are (file_name, file_id) pairs; a file_id means the remote file
+        # already exists and its content is replaced instead of creating a copy.
+        total = len(tasks)
+        results = {'uploaded': {}, 'failed': {}}
+        lock = threading.Lock()
+        verbose = workers <= 1
+
+        def push(task):
+            file_name, file_id = task
+            try:
+                if file_id is None:
+                    file_id = self.upload_file(file_name, folder_id, directory_path, verbose=verbose)
+                else:
+                    file_id = self.update_file(file_id, file_name, directory_path, verbose=verbose)
+            except Exception as e:
+                with lock:
+                    results['failed'][file_name] = str(e)
+                print(f"Failed to upload {file_name}: {e}")
+                return
+            with lock:
+                results['uploaded'][file_name] = file_id
+                finished = len(results['uploaded']) + len(results['failed'])
+            if not verbose:
+                print(f"[{finished}/{total}] Uploaded {file_name}")
+
+        if workers <= 1:
+            for task in tasks:
+                push(task)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(push, tasks))
+
+        if verify:
+            self.verify_uploads(results, directory_path)
+        if total:
+            print(f"Uploaded {len(results['uploaded'])}, failed {len(results['failed'])} of {total} files.")
+        return results
+
+    def sync_uploads(self, files, folder_id, directory_path, workers=1):
+        # Upload new files and refresh changed ones; unchanged files are decided
+        # from the local manifest without listing the remote folder at all.
+        remote_files = None
+        with SyncManifest(directory_path) as manifest:
+            tasks = []
+            checksums = {}
+            entries = {}
+            for file_name in files:
+                checksums[file_name] = file_md5(os.path.join(directory_path, file_name))
+                entries[file_name] = manifest.get_upload(folder_id, file_name)
+            # Files about to be updated are checked first, in one batch, since
+            # they may have been deleted or trashed on Drive since the last run
+            stale = [entry['id'] for file_name, entry in entries.items()
+                     if entry is not None and entry.get('md5Checksum') != checksums[file_name]]
+            if stale:
+                metadata = self.get_metadata(stale, fields='id, trashed')
+                for file_name, entry in entries.items():
+                    if entry is not None and entry['id'] in metadata:
+                        remote = metadata[entry['id']]
+                        if remote is None or remote.get('trashed'):
+                            manifest.remove_upload(folder_id, file_name)
+                            entries[file_name] = None
+                            self.invalidate_folder_index(folder_id)
+            for file_name in files:
+                md5 = checksums[file_name]
+                entry = entries[file_name]
+                if entry is None:
+                    if remote_files is None:
+                        remote_files = self.get_folder_index(folder_id)['by_name']
+                    entry = remote_files.get(file_name)
+                if entry is None:
+                    tasks.append((file_name, None))
+                elif entry.get('md5Checksum') != md5:
+                    tasks.append((file_name, entry['id']))
+                else:
+                    manifest.record_upload(folder_id, file_name, entry['id'], md5)
+
+            results = self.upload_items(tasks, folder_id, directory_path, workers=workers)
+            # Only what Drive confirms goes into the manifest
+            self.verify_uploads(results, directory_path, checksums)
+            for file_name, file_id in results['uploaded'].items():
+                manifest.record_upload(folder_id, file_name, file_id, checksums[file_name])
+                self.add_to_folder_index(folder_id, {'id': file_id, 'name': file_name, 'md5Checksum': checksums[file_name]})
+        return results
+
+    def download_pdfs(self, folder_id, save_dir='PDF_docs', limit = None, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, sync=False, recursive=False):
+        if sync:
+            return self.sync_folder(folder_id, save_dir, ['application/pdf'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
+        return self.download_folder(folder_id, save_dir, ['application/pdf'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
 
-    def upload_txt(self, folder_id, directory_path='.'):
+    def upload_txt(self, folder_id, directory_path='.', sync=False, workers=1, verify=False):
         self.ensure_directory(directory_path)
         files = [f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f)) and f.endswith('.txt')]
-        existing_files = self.get_existing_files(folder_id)
+        if sync:
+            return self.sync_uploads(files, folder_id, directory_path, workers=workers)
+        existing_files = self.get_folder_index(folder_id)['by_name']
+        tasks = [(file_name, None) for file_name in files if file_name not in existing_files]
+        return self.upload_items(tasks, folder_id, directory_path, workers=workers, verify=verify)
 
-        for file_name in files:
-            if file_name not in existing_files:
-                self.upload_file(file_name, folder_id, directory_path)
+    def iter_pdf_pages(self, pdf_path, start=0, stop=None, max_pages=None):
+        return iter_pdf_pages(pdf_path, start=start, stop=stop, max_pages=max_pages)
 
-    def convert_pdf_to_text(self, pdf_path):
-        text = ""
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text += page.get_text()
-        return text
+    def convert_pdf_to_text(self, pdf_path, start=0, stop=None, max_pages=None, output_path=None):
+        with self.instrumentation.span('extract_pdf', file=os.path.basename(pdf_path)) as span:
+            pages = counted(iter_pdf_pages(pdf_path, start=start, stop=stop, max_pages=max_pages), span, 'pages')
+            # Writing page by page keeps memory bounded on very large documents
+            if output_path is not None:
+                write_pages_atomic(output_path, pages)
+                return output_path
+            text = ''.join(pages)
+            span['chars'] = len(text)
+            return text
 
-    def process_pdfs_in_dir(self, directory_path):
+    def process_pdfs_in_dir(self, directory_path, jobs=1, split_pages=None):
         self.ensure_directory(directory_path)
+        if jobs > 1:
+            return self.process_pdfs_parallel(directory_path, jobs, split_pages=split_pages)
+        report = {'converted': [], 'failed': {}}
         for filename in os.listdir(directory_path):
             if filename.lower().endswith('.pdf'):
                 full_path = os.path.join(directory_path, filename)
-                pdf_text = self.convert_pdf_to_text(full_path)
                 output_filename = filename.rsplit('.', 1)[0] + '.txt'
                 output_path = os.path.join(directory_path, output_filename)
-                with open(output_path, 'w', encoding='utf-8') as text_file:
-                    text_file.write(pdf_text)
+                try:
+                    pdf_text = self.convert_pdf_to_text(full_path)
+                    write_pages_atomic(output_path, [pdf_text])
+                except Exception as e:
+                    report['failed'][filename] = str(e)
+                    print(f"Failed to process {filename}: {e}")
+                    continue
+                report['converted'].append(filename)
                 print(f"Processed and saved: {filename} as {output_filename}")
+        return report
+
+    def process_pdfs_parallel(self, directory_path, jobs, split_pages=None):
+        # Text extraction is CPU-bound, so files are spread across processes.
+        # PDFs longer than split_pages are cut into page ranges that are
+        # extracted in parallel and stitched back together in order.
+        pdf_files = [f for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+        report = {'converted': [], 'failed': {}}
+
+        def finish(filename, error=None):
+            if error is not None:
+                report['failed'][filename] = str(error)
+                print(f"Failed to process {filename}: {error}")
+            else:
+                report['converted'].append(filename)
+                print(f"Processed and saved: {filename} as {filename.rsplit('.', 1)[0] + '.txt'}")
+
+        with self.instrumentation.span('convert_pdfs', directory=directory_path, jobs=jobs) as span, ProcessPoolExecutor(max_workers=jobs) as executor:
+            whole = {}
+            segmented = {}
+            for filename in pdf_files:
+                full_path = os.path.join(directory_path, filename)
+                output_path = os.path.join(directory_path, filename.rsplit('.', 1)[0] + '.txt')
+                page_count = 0
+                if split_pages:
+                    try:
+                        with fitz.open(full_path) as doc:
+                            page_count = doc.page_count
+                    except Exception as e:
+                        finish(filename, e)
+                        continue
+                if split_pages and page_count > split_pages:
+                    segmented[filename] = (output_path, [
+                        executor.submit(pdf_text_range, full_path, start, start + split_pages)
+                        for start in range(0, page_count, split_pages)
+                    ])
+                else:
+                    whole[executor.submit(convert_pdf_job, full_path, output_path)] = filename
 
-    def docx_to_text(self, docx_file_path):
-        doc = Document(docx_file_path)
-        text = [paragraph.text for paragraph in doc.paragraphs]
-        return '\n'.join(text)
+            for future in as_completed(whole):
+                finish(whole[future], future.exception())
 
-    def convert_docx_to_txt(self, folder_path):
+            for filename, (output_path, futures) in segmented.items():
+                try:
+                    write_pages_atomic(output_path, (future.result() for future in futures))
+                except Exception as e:
+                    finish(filename, e)
+                else:
+                    finish(filename)
+            span['files'] = len(report['converted'])
+
+        print(f"Converted {len(report['converted'])} of {len(pdf_files)} PDFs, {len(report['failed'])} failed.")
+        return report
+
+    def docx_to_text(self, docx_file_path, method='xml'):
+        # method='xml' streams the document XML and includes table text;
+        # method='python-docx' reads body paragraphs through python-docx
+        if method not in ('xml', 'python-docx'):
+            raise ValueError(f"Invalid method: {method}")
+        with self.instrumentation.span('extract_docx', file=os.path.basename(docx_file_path)) as span:
+            if method == 'xml':
+                text = '\n'.join(iter_docx_paragraphs(docx_file_path))
+            else:
+                doc = Document(docx_file_path)
+                text = '\n'.join(paragraph.text for paragraph in doc.paragraphs)
+            span['chars'] = len(text)
+        return text
+
+    def convert_docx_to_txt(self, folder_path, jobs=1):
         self.ensure_directory(folder_path)
-        for file_name in os.listdir(folder_path):
-            if file_name.endswith('.docx'):
-                docx_file_path = os.path.join(folder_path, file_name)
-                text_file_name = file_name.replace('.docx', '.txt')
-                text_file_path = os.path.join(folder_path, text_file_name)
-                text_content = self.docx_to_text(docx_file_path)
-                with open(text_file_path, 'w', encoding='utf-8') as text_file:
-                    text_file.write(text_content)
+        report = {'converted': [], 'failed': {}}
+        docx_files = [f for f in os.listdir(folder_path) if f.endswith('.docx')]
+
+        def finish(file_name, error=None):
+            text_file_name = file_name.replace('.docx', '.txt')
+            if error is not None:
+                report['failed'][file_name] = str(error)
+                print(f"Failed to convert {file_name}: {error}")
+            else:
+                report['converted'].append(file_name)
                 print(f"Converted {file_name} to {text_file_name}")
 
-    def download_txt(self, folder_id, save_dir='Text_docs', limit = None):
-        self.ensure_directory(save_dir)
-        page_token = None
-        downloaded_files = 0
-        
-        while True:
-            results = self.service.files().list(
-                q=f"'{folder_id}' in parents and mimeType='text/plain' and trashed=false",
-                spaces='drive',
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token,
-                pageSize=10
-            ).execute()
-            items = results.get('files', [])
-            if not items:
-                print('No more files found.')
-                break
-            for item in items:
-                if limit is not None and downloaded_files >= limit:
-                    print(f"Download limit of {limit} files reached.")
-                    return
-                self.download_file(item, save_dir)
-                downloaded_files += 1
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
+        if jobs > 1:
+            with self.instrumentation.span('convert_docx', directory=folder_path, jobs=jobs) as span, ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(convert_docx_job, os.path.join(folder_path, file_name), os.path.join(folder_path, file_name.replace('.docx', '.txt'))): file_name
+                    for file_name in docx_files
+                }
+                for future in as_completed(futures):
+                    finish(futures[future], future.exception())
+                span['files'] = len(report['converted'])
+            return report
 
-    def download_docs(self, folder_id, save_dir='Doc_docs', limit = None):
-        self.ensure_directory(save_dir)
-        query = f"'{folder_id}' in parents and (mimeType='application/msword' or mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document') and trashed=false"
-        page_token = None
-        downloaded_files = 0
-        
-        while True:
-            results = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token,
-                pageSize=10
-            ).execute()
-            items = results.get('files', [])
-            if not items:
-                print('No more files found.')
-                break
-            for item in items:
-                if limit is not None and downloaded_files >= limit:
-                    print(f"Download limit of {limit} files reached.")
-                    return
-                self.download_file(item, save_dir)
-                downloaded_files += 1
-            page_token = results.get('nextPageToken', None)
-            if page_token is None:
-                break
+        for file_name in docx_files:
+            docx_file_path = os.path.join(folder_path, file_name)
+            text_file_path = os.path.join(folder_path, file_name.replace('.docx', '.txt'))
+            try:
+                text_content = self.docx_to_text(docx_file_path)
+                write_pages_atomic(text_file_path, [text_content])
+            except Exception as e:
+                finish(file_name, e)
+                continue
+            finish(file_name)
+        return report
+
+    def download_txt(self, folder_id, save_dir='Text_docs', limit = None, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, sync=False, recursive=False):
+        if sync:
+            return self.sync_folder(folder_id, save_dir, ['text/plain'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
+        return self.download_folder(folder_id, save_dir, ['text/plain'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
+
+    def download_docs(self, folder_id, save_dir='Doc_docs', limit = None, workers=1, chunk_size=DOWNLOAD_CHUNK_SIZE, sync=False, recursive=False):
+        if sync:
+            return self.sync_folder(folder_id, save_dir, ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
+        return self.download_folder(folder_id, save_dir, ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'], limit=limit, workers=workers, chunk_size=chunk_size, recursive=recursive)
     
-    def upload_docs(self, folder_id, directory_path='.'):
+    def upload_docs(self, folder_id, directory_path='.', sync=False, workers=1, verify=False):
         self.ensure_directory(directory_path)
         files = [f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f)) and (f.endswith('.docx') or f.endswith('.doc'))]
-        existing_files = self.get_existing_files(folder_id)
-
-        for file_name in files:
-            if file_name not in existing_files:
-                self.upload_file(file_name, folder_id, directory_path)    
+        if sync:
+            return self.sync_uploads(files, folder_id, directory_path, workers=workers)
+        existing_files = self.get_folder_index(folder_id)['by_name']
+        tasks = [(file_name, None) for file_name in files if file_name not in existing_files]
+        return self.upload_items(tasks, folder_id, directory_path, workers=workers, verify=verify)    
       
       
       #This part add LLM to the package allowing users to summarize PDFs easily
       #Begin by pre-processing the data
       
-    def preprocess_text(self, text):
-        lemmatizer = WordNetLemmatizer()
-        sentences = nltk.sent_tokenize(text)
-        punctuation = set(string.punctuation)
-
-        processed_sentences = []
-        for sent in sentences:
-            words = nltk.word_tokenize(sent)
-            filtered_words = [
-                lemmatizer.lemmatize(word.lower()) 
-                for word in words 
-                if word.lower() not in punctuation and word.isalpha()
-            ]
-            processed_sentences.append(' '.join(filtered_words))
+    def preprocess_text(self, text, tokenizer='nltk'):
+        with self.instrumentation.span('preprocess', tokenizer=tokenizer) as span:
+            span['chars'] = len(text)
+            return preprocess_document(text, tokenizer=tokenizer)
 
-        processed_text = ' '.join(processed_sentences)
-        processed_text = re.sub(r'\d+', '', processed_text)
+    def preprocess_texts(self, texts, tokenizer='nltk', jobs=1, chunksize=16):
+        # Batch preprocessing; with jobs > 1 documents are spread over processes
+        with self.instrumentation.span('preprocess', tokenizer=tokenizer, jobs=jobs) as span:
+            span['chars'] = sum(len(text) for text in texts)
+            if jobs <= 1:
+                return [preprocess_document(text, tokenizer=tokenizer) for text in texts]
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                return list(executor.map(functools.partial(preprocess_document, tokenizer=tokenizer), texts, chunksize=chunksize))
 
-        return processed_text
+    def extract_text_from_pdf(self, pdf_path, start=0, stop=None, max_pages=None):
+        return self.convert_pdf_to_text(pdf_path, start=start, stop=stop, max_pages=max_pages)
 
-    def extract_text_from_pdf(self, pdf_path):
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+    def prepare_pdf_text(self, pdf_path, cache=None):
+        # Extraction, section splitting and preprocessing are deterministic, so
+        # with a cache their outputs are reused for any file with the same content.
+        file_hash = file_sha256(pdf_path) if cache is not None else None
 
-    def extract_sections(self, text):
-        sections = {
-            "methodology": "",
-            "methods": "",
-            "results": "",
-            "discussion": "",
-            "conclusion": ""
-        }
-    
-        current_section = None
-        start_extracting = False
-        is_discussion = False
-    
-        for line in text.split('\n'):
-            line_lower = line.strip().lower()
+        def cached(stage, compute):
+            if cache is None:
+                return compute()
+            return cache.get_or_compute(file_hash, stage, compute)
 
-            # Stop extracting when "references" section is encountered
-            if line_lower.startswith("references"):
-                start_extracting = False
-        
-            # Start extracting from "methodology" sections
-            elif ("methodology" in line_lower or 
-                "methods" in line_lower or 
-                "materials and methods" in line_lower or 
-                "materials & methods" in line_lower) and not is_discussion:
-                
-                current_section = "methodology"
-                start_extracting = True
-        
-            # Start extracting from the "results" section
-            elif "results" in line_lower and not is_discussion:
-                current_section = "results"
-                start_extracting = True
-        
-            # Start extracting from the "discussion" section
-            elif "discussion" in line_lower:
-                current_section = "discussion"
-                is_discussion = True
-                start_extracting = True
-        
-            # Start extracting from the "conclusion" section
-            elif "conclusion" in line_lower:
-                current_section = "conclusion"
-                start_extracting = True
-        
-            # Stop extracting when "acknowledgements" section is encountered
-            elif "acknowledgements" in line_lower:
-                start_extracting = False
-        
-            # Add lines to the current section if extracting is active
-            if start_extracting and current_section:
-                sections[current_section] += line + "\n"
+        text = cached('text', lambda: self.extract_text_from_pdf(pdf_path))
+        if not text.strip():
+            return text, ''
+        combined_text = cached('sections', lambda: self.extract_sections(text)[0])
+        preprocessed_text = cached('preprocessed', lambda: self.preprocess_text(combined_text))
+        return text, preprocessed_text
 
-        # Combine the extracted sections
-        combined_text = (sections["methodology"] + sections["results"] + 
-                         sections["discussion"] + sections["conclusion"])
-    
-        return combined_text, sections
+    def extract_sections(self, text, headings=None, stop_headings=None):
+        sections = segment_sections(text, headings=headings, stop_headings=stop_headings)
+        return sections.combined(), sections
+
+
+    def get_rate_limiter(self, selected_model):
+        provider = MODEL_PROVIDERS.get(selected_model, selected_model)
+        with self._rate_limiter_lock:
+            limiter = self._rate_limiters.get(provider)
+            if limiter is None:
+                limiter = RateLimiter(self.rate_limits.get(provider, 60))
+                self._rate_limiters[provider] = limiter
+        return limiter
+
+    def cached_response(self, response_cache, selected_model, prompt, text):
+        if response_cache is None:
+            return None
+        temperature = MODEL_TEMPERATURES[MODEL_PROVIDERS[selected_model]]
+        return response_cache.get(selected_model, temperature, prompt, text)
+
+    def store_response(self, response_cache, selected_model, prompt, text, response):
+        if response_cache is not None:
+            temperature = MODEL_TEMPERATURES[MODEL_PROVIDERS[selected_model]]
+            response_cache.put(selected_model, temperature, prompt, text, response)
 
+    def call_llm(self, conversation, text, selected_model):
+        with self.instrumentation.span('llm', model=selected_model) as span:
+            span['tokens'] = count_tokens(text, selected_model)
+            span['requests'] = 1
+            return conversation.run(text)
+
+    async def map_reduce_summary(self, conversation, pieces, selected_model, token_budget=None, max_concurrency=4, prompt='', response_cache=None):
+        # Map: summarize every piece concurrently. Reduce: summarize the joined
+        # partial summaries, re-packing them while they exceed the token budget.
+        if token_budget is None:
+            token_budget = self.context_budget(selected_model)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limiter = self.get_rate_limiter(selected_model)
+
+        async def summarize(piece):
+            # The blocking call runs on a worker thread so it goes through the
+            # shared connection pool; async clients can't be reused once the
+            # event loop of an earlier document has closed.
+            # Cached responses don't count against the rate limit
+            response = self.cached_response(response_cache, selected_model, prompt, piece)
+            if response is not None:
+                self.instrumentation.count('llm', 'cached', model=selected_model)
+                return response
+            async with semaphore:
+                await limiter.wait()
+                response = await asyncio.to_thread(self.call_llm, conversation, piece, selected_model)
+            self.store_response(response_cache, selected_model, prompt, piece, response)
+            return response
+
+        while True:
+            partials = await asyncio.gather(*(summarize(piece) for piece in pieces))
+            if len(partials) == 1:
+                return partials[0]
+            combined = '\n\n'.join(partials)
+            if count_tokens(combined, selected_model) <= token_budget:
+                return await summarize(combined)
+            next_pieces = self.pack_chunks(partials, selected_model, token_budget, separator='\n\n')
+            # Stop if the partial summaries are not getting any shorter
+            if len(next_pieces) >= len(pieces):
+                return combined
+            pieces = next_pieces
+
+    def get_http_client(self):
+        # One keep-alive connection pool shared by every LLM client, so
+        # documents in a batch reuse open connections to the provider
+        with self._llm_lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS
+                    ),
+                    timeout=self.llm_timeout
+                )
+            return self._http_client
+
+    def get_http_async_client(self):
+        # Summaries go through the pooled sync client; the async client is only
+        # there for callers that use the chain's async API directly. It is
+        # passed explicitly so the LLM clients don't each build their own.
+        with self._llm_lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(timeout=self.llm_timeout)
+            return self._http_async_client
 
     def get_model(self, selected_model, OPENAI_API_KEY, GROQ_API_KEY):
-        if selected_model == "llama3-8b-8192":
-            return ChatGroq(groq_api_key=GROQ_API_KEY, model="llama3-8b-8192", temperature=0.02, max_tokens=None, timeout=None, max_retries=2)
-        elif selected_model == "llama3-70b-8192":
-            return ChatGroq(groq_api_key=GROQ_API_KEY, model="llama3-70b-8192", temperature=0.02, max_tokens=None, timeout=None, max_retries=2) 
-        elif selected_model == "gpt-4o-mini":
-            return ChatOpenAI(model="gpt-4o-mini", temperature=0, max_tokens=None, timeout=None, max_retries=2, api_key=OPENAI_API_KEY)
-        elif selected_model == "gpt-4o":
-            return ChatOpenAI(model="gpt-4o", temperature=0, max_tokens=None, timeout=None, max_retries=2, api_key=OPENAI_API_KEY)
-        elif selected_model == "gpt-4":
-            return ChatOpenAI(model="gpt-4", temperature=0, max_tokens=None, timeout=None, max_retries=2, api_key=OPENAI_API_KEY)
-        else:
+        # Clients are created once per (model, key) and reused
+        provider = MODEL_PROVIDERS.get(selected_model)
+        if provider is None:
             raise ValueError("Invalid model selected")
+        api_key = GROQ_API_KEY if provider == "groq" else OPENAI_API_KEY
+        key = (selected_model, api_key)
+        with self._llm_lock:
+            client = self._llm_clients.get(key)
+        if client is not None:
+            return client
+
+        http_client = self.get_http_client()
+        http_async_client = self.get_http_async_client()
+        if provider == "groq":
+            client = ChatGroq(groq_api_key=api_key, model=selected_model, temperature=MODEL_TEMPERATURES[provider], max_tokens=None, timeout=self.llm_timeout, max_retries=self.llm_max_retries, http_client=http_client, http_async_client=http_async_client)
+        else:
+            client = ChatOpenAI(model=selected_model, temperature=MODEL_TEMPERATURES[provider], max_tokens=None, timeout=self.llm_timeout, max_retries=self.llm_max_retries, api_key=api_key, http_client=http_client, http_async_client=http_async_client)
+        with self._llm_lock:
+            return self._llm_clients.setdefault(key, client)
+
+    def get_chain(self, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY):
+        # The prompt template and chain only depend on the model and the
+        # system prompt, so a batch builds them once
+        key = (selected_model, GROQ_API_KEY if MODEL_PROVIDERS.get(selected_model) == "groq" else OPENAI_API_KEY, prompt)
+        with self._llm_lock:
+            chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+
+        llm_mod = self.get_model(selected_model, OPENAI_API_KEY, GROQ_API_KEY)
+        prompt_template = ChatPromptTemplate.from_messages([
+        SystemMessage(content=prompt),
+        HumanMessagePromptTemplate.from_template("{text}")
+        ])
+        chain = LLMChain(llm=llm_mod, prompt=prompt_template)
+        with self._llm_lock:
+            return self._chains.setdefault(key, chain)
+
+    def close_llm_clients(self):
+        with self._llm_lock:
+            self._chains.clear()
+            self._llm_clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            async_client, self._http_async_client = self._http_async_client, None
+        if async_client is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(async_client.aclose())
+            else:
+                # Called from a coroutine; the client closes once it yields
+                loop.create_task(async_client.aclose())
 
     def chunk_text_with_langchain(self, text, chunk_size=8000, chunk_overlap=500):
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         chunks = text_splitter.split_text(text)
         return chunks
 
-    def embed_chunks(self, chunks, VOYAGEAI_API_key):
-        vo = voyageai.Client(api_key=VOYAGEAI_API_key)
-        result = vo.embed(chunks, model="voyage-large-2-instruct", input_type="document")
-        vectors = result.embeddings
-        return np.array(vectors)
+    def context_budget(self, selected_model, prompt=''):
+        # Tokens left for document text in a single call to the model
+        context = MODEL_CONTEXT_TOKENS.get(selected_model, DEFAULT_CONTEXT_TOKENS)
+        return context - count_tokens(prompt, selected_model) - SUMMARY_OUTPUT_TOKENS - MESSAGE_OVERHEAD_TOKENS
+
+    def chunk_text_by_tokens(self, text, selected_model, max_tokens=2000, overlap_tokens=125):
+        # Same recursive paragraph/sentence/word splitting as
+        # chunk_text_with_langchain, measured in the model's tokens
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max_tokens,
+            chunk_overlap=overlap_tokens,
+            length_function=lambda text: count_tokens(text, selected_model)
+        )
+        return text_splitter.split_text(text)
 
-    def clustering(self, vectors, num_clusters):
-        kmeans = KMeans(n_clusters=num_clusters, random_state=42).fit(vectors)
-        labels = kmeans.labels_
+    def pack_chunks(self, chunks, selected_model, token_budget, separator=' '):
+        # Greedily fills each request with as many consecutive chunks as fit in
+        # the budget, keeping document order. A chunk that is too large on its
+        # own is split by tokens first.
+        separator_tokens = count_tokens(separator, selected_model) if separator else 0
+        packs = []
+        current = []
+        current_tokens = 0
+        for chunk in chunks:
+            tokens = count_tokens(chunk, selected_model)
+            if tokens > token_budget:
+                pieces = self.chunk_text_by_tokens(chunk, selected_model, max_tokens=token_budget, overlap_tokens=0)
+            else:
+                pieces = [chunk]
+            for piece in pieces:
+                if len(pieces) > 1:
+                    tokens = count_tokens(piece, selected_model)
+                needed = tokens + (separator_tokens if current else 0)
+                if current and current_tokens + needed > token_budget:
+                    packs.append(separator.join(current))
+                    current = []
+                    current_tokens = 0
+                    needed = tokens
+                current.append(piece)
+                current_tokens += needed
+        if current:
+            packs.append(separator.join(current))
+        return packs
 
-        closest_indices = []
-        for i in range(num_clusters):
-            distances = np.linalg.norm(vectors - kmeans.cluster_centers_[i], axis=1)
-            closest_index = np.argmin(distances)
-            closest_indices.append(closest_index)
+    def get_voyage_client(self, VOYAGEAI_API_key):
+        with self._voyage_lock:
+            client = self._voyage_clients.get(VOYAGEAI_API_key)
+            if client is None:
+                client = voyageai.Client(api_key=VOYAGEAI_API_key)
+                self._voyage_clients[VOYAGEAI_API_key] = client
+        return client
 
-        selected_indices = sorted(closest_indices)
-        return selected_indices
+    def make_embedding_batches(self, chunks, indices, batch_size=EMBEDDING_BATCH_SIZE, max_batch_tokens=EMBEDDING_BATCH_TOKENS):
+        # Keep each request under the API's input-count and token limits.
+        # Voyage uses its own tokenizer, so tokens are estimated from length.
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for i in indices:
+            tokens = len(chunks[i]) // CHARS_PER_TOKEN + 1
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
 
-    def filter_redundant_chunks(self, chunks, vectors, similarity_threshold=0.8):
-        unique_chunks = []
-        unique_vectors = []
+    def embed_chunks(self, chunks, VOYAGEAI_API_key, model=EMBEDDING_MODEL, input_type="document", cache=None, workers=4, batch_size=EMBEDDING_BATCH_SIZE, max_batch_tokens=EMBEDDING_BATCH_TOKENS):
+        vo = self.get_voyage_client(VOYAGEAI_API_key)
+        vectors = [None] * len(chunks)
+        if cache is not None:
+            for i, vector in cache.lookup(model, input_type, chunks).items():
+                vectors[i] = vector
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        batches = self.make_embedding_batches(chunks, missing, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+
+        def embed_batch(batch):
+            result = vo.embed([chunks[i] for i in batch], model=model, input_type=input_type)
+            return batch, result.embeddings
 
-        for i, vector in enumerate(vectors):
-            if len(unique_vectors) == 0:
-                unique_chunks.append(chunks[i])
-                unique_vectors.append(vector)
+        with self.instrumentation.span('embed', model=model) as span:
+            span['chunks'] = len(chunks)
+            span['cached'] = len(chunks) - len(missing)
+            span['requests'] = len(batches)
+            span['tokens'] = sum(len(chunks[i]) // CHARS_PER_TOKEN + 1 for i in missing)
+            if len(batches) > 1 and workers > 1:
+                with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+                    results = list(executor.map(embed_batch, batches))
             else:
-                similarities = cosine_similarity([vector], unique_vectors)
-                if max(similarities[0]) < similarity_threshold:
-                    unique_chunks.append(chunks[i])
-                    unique_vectors.append(vector)
+                results = [embed_batch(batch) for batch in batches]
+
+        for batch, embeddings in results:
+            for i, vector in zip(batch, embeddings):
+                vectors[i] = vector
+            if cache is not None:
+                cache.add(model, input_type, [chunks[i] for i in batch], embeddings)
+        return np.array(vectors)
+
+    def clustering(self, vectors, num_clusters, method='auto', max_threads=None, random_state=42):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        num_clusters = min(num_clusters, len(vectors))
+        if method == 'auto':
+            method = 'minibatch' if len(vectors) > MINIBATCH_KMEANS_THRESHOLD else 'kmeans'
+
+        # Capping BLAS/OpenMP threads keeps several summarizer processes from
+        # oversubscribing the machine; None leaves the limits untouched.
+        with self.instrumentation.span('cluster', method=method) as span, threadpool_limits(limits=max_threads):
+            span['vectors'] = len(vectors)
+            if method == 'kcenter':
+                return sorted(k_center_greedy(vectors, num_clusters))
+            elif method == 'minibatch':
+                model = MiniBatchKMeans(n_clusters=num_clusters, random_state=random_state, batch_size=1024, n_init=3)
+            elif method == 'kmeans':
+                model = KMeans(n_clusters=num_clusters, random_state=random_state)
+            else:
+                raise ValueError(f"Invalid clustering method: {method}")
+            # Distances from every vector to every center in one pass
+            distances = model.fit_transform(vectors)
+
+        return sorted(unique_representatives(distances))
 
-        return unique_chunks, unique_vectors
+    def filter_redundant_indices(self, vectors, similarity_threshold=0.8, block_size=DEDUP_BLOCK_SIZE):
+        return dedup_indices(vectors, similarity_threshold=similarity_threshold, block_size=block_size)
+
+    def filter_redundant_chunks(self, chunks, vectors, similarity_threshold=0.8):
+        with self.instrumentation.span('dedup') as span:
+            keep = self.filter_redundant_indices(vectors, similarity_threshold=similarity_threshold)
+            span['vectors'] = len(chunks)
+            span['kept'] = len(keep)
+        return [chunks[i] for i in keep], np.asarray(vectors)[keep]
     
     
-    def summarize_text(self, text, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10):
-        llm_mod = self.get_model(selected_model, OPENAI_API_KEY, GROQ_API_KEY)
+    def summarize_text(self, text, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10, embedding_cache=None, chunks=None, vectors=None, clustering_method='auto', max_threads=None, max_concurrency=4, response_cache=None):
         system_prompt = prompt
-        prompt_template = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt),
-        HumanMessagePromptTemplate.from_template("{text}")
-        ])
-        
-        conversation = LLMChain(llm=llm_mod, prompt=prompt_template)
+        conversation = self.get_chain(selected_model, system_prompt, OPENAI_API_KEY, GROQ_API_KEY)
+        token_budget = self.context_budget(selected_model, system_prompt)
         
         if selected_model in ["llama3-8b-8192", "llama3-70b-8192", "gpt-4"]:
-            chunks = self.chunk_text_with_langchain(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            vectors = self.embed_chunks(chunks, VOYAGEAI_API_key)
+            # Callers that already chunked/embedded the text pass the results in
+            if chunks is None:
+                chunks = self.chunk_text_by_tokens(text, selected_model, max_tokens=chunk_size // CHARS_PER_TOKEN, overlap_tokens=chunk_overlap // CHARS_PER_TOKEN)
+            if vectors is None:
+                vectors = self.embed_chunks(chunks, VOYAGEAI_API_key, cache=embedding_cache)
             
             unique_chunks, unique_vectors = self.filter_redundant_chunks(chunks, vectors, similarity_threshold=similarity_threshold)
             
             num_clusters = min(num_clusters, len(unique_chunks))
             
-            selected_indices = self.clustering(unique_vectors, num_clusters)
+            selected_indices = self.clustering(unique_vectors, num_clusters, method=clustering_method, max_threads=max_threads)
             selected_chunks = [unique_chunks[i] for i in selected_indices]
-            selected_text = ' '.join(selected_chunks)
-            
-            if len(selected_text) > chunk_size:
-                final_summary_chunks = []
-                for i in range(0, len(selected_text), chunk_size):
-                    final_summary_chunks.append(conversation.run(selected_text[i:i + chunk_size]))
-                summary = ' '.join(final_summary_chunks)
-            
-            else:
-                summary = conversation.run(selected_text)
+            pieces = self.pack_chunks(selected_chunks, selected_model, token_budget)
         else:
-            summary = conversation.run(text)
-        return summary
+            pieces = self.pack_chunks([text], selected_model, token_budget)
+
+        # A single piece also goes through map_reduce_summary, so every call
+        # shares the provider's rate limiter and the response cache
+        return run_coroutine(self.map_reduce_summary(conversation, pieces or [text], selected_model, token_budget=token_budget, max_concurrency=max_concurrency, prompt=system_prompt, response_cache=response_cache))
 
     
     def save_summary_as_docx(self, summary, output_path, pdf_filename):
@@ -511,7 +1672,116 @@ class GoogleDriveHandler:
 
     
 
-    def summarize_pdfs(self, pdf_directory, output_directory, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10):
+    def summarize_pdf(self, pdf_path, output_path, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10, cache=None, embedding_cache=None, max_threads=None, response_cache=None):
+        pdf_filename = os.path.basename(pdf_path)
+        with self.instrumentation.span('summarize_pdf', file=pdf_filename):
+            text, preprocessed_text = self.prepare_pdf_text(pdf_path, cache=cache)
+
+            # Skip processing if extracted text is empty
+            if not text.strip():
+                print(f"No text found in {pdf_filename}. Skipping...")
+                return None
+
+            # Skip processing if preprocessed text is empty
+            if not preprocessed_text.strip():
+                print(f"No meaningful text after preprocessing for {pdf_filename}. Skipping...")
+                return None
+
+            # Chunking the preprocessed text
+            chunks = self.chunk_text_by_tokens(preprocessed_text, selected_model, max_tokens=chunk_size // CHARS_PER_TOKEN, overlap_tokens=chunk_overlap // CHARS_PER_TOKEN)
+
+            # Skip summarizing if there are no chunks
+            if not chunks:
+                print(f"No chunks generated for {pdf_filename}. Skipping...")
+                return None
+
+            # The chunks are handed to summarize_text, which embeds them once for
+            # the redundancy filter and clustering stage
+            summary = self.summarize_text(preprocessed_text, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size, chunk_overlap, similarity_threshold, num_clusters, embedding_cache=embedding_cache, chunks=chunks, max_threads=max_threads, response_cache=response_cache)
+
+            self.save_summary_as_docx(summary, output_path, pdf_filename)
+            return summary
+
+    def summarize_directory(self, pdf_directory, output_directory, selected_model, prompt=DEFAULT_SUMMARY_PROMPT, OPENAI_API_KEY=None, GROQ_API_KEY=None, VOYAGEAI_API_key=None, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10, workers=4, use_cache=True, cache_dir=None, progress_callback=None):
+        # Headless batch summarization. Documents run concurrently on a thread
+        # pool (the work is dominated by embedding and LLM calls), and every
+        # finished document is appended to a checkpoint log in the output
+        # directory so an interrupted run resumes where it stopped.
+        self.ensure_directory(output_directory)
+        checkpoint_path = os.path.join(output_directory, CHECKPOINT_FILENAME)
+        # A document only counts as finished for the same model and prompt
+        run_key = {'model': selected_model, 'prompt_sha256': text_hash(prompt)}
+        completed = set()
+        summarized = set()
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('status') in ('done', 'skipped'):
+                        summarized.add(entry['file'])
+                        if all(entry.get(key) == value for key, value in run_key.items()):
+                            completed.add(entry['file'])
+
+        pdf_files = sorted(f for f in os.listdir(pdf_directory) if f.endswith('.pdf'))
+        total_files = len(pdf_files)
+        # Share the cores between concurrent documents during clustering. BLAS
+        # thread limits are process-wide, so they are set once around the pool
+        # rather than per document, where overlapping documents would restore
+        # each other's limits.
+        max_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        results = []
+        checkpoint_lock = threading.Lock()
+
+        def summarize_one(pdf_filename):
+            pdf_path = os.path.join(pdf_directory, pdf_filename)
+            output_path = os.path.join(output_directory, f"Summary-{os.path.splitext(pdf_filename)[0]}.docx")
+            result = dict(run_key, file=pdf_filename, output=output_path)
+            start = time.perf_counter()
+            # Summaries from before checkpointing have no entry and are kept
+            if pdf_filename in completed or (pdf_filename not in summarized and os.path.exists(output_path)):
+                result['status'] = 'exists'
+                result['seconds'] = 0.0
+                return result
+            try:
+                summary = self.summarize_pdf(pdf_path, output_path, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size, chunk_overlap, similarity_threshold, num_clusters, cache=cache, embedding_cache=embedding_cache, max_threads=None, response_cache=response_cache)
+                result['status'] = 'skipped' if summary is None else 'done'
+            except Exception as e:
+                result['status'] = 'failed'
+                result['error'] = str(e)
+                print(f"Failed to summarize {pdf_filename}: {e}")
+            result['seconds'] = time.perf_counter() - start
+            with checkpoint_lock, open(checkpoint_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result) + '\n')
+            return result
+
+        # Load the NLTK data before the workers preprocess their first documents
+        ensure_nltk_data()
+        cache = ExtractionCache(cache_dir) if use_cache else None
+        embedding_cache = EmbeddingCache(cache_dir) if use_cache else None
+        response_cache = ResponseCache(cache_dir) if use_cache else None
+        try:
+            with threadpool_limits(limits=max_threads), ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                futures = [executor.submit(summarize_one, pdf_filename) for pdf_filename in pdf_files]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    if progress_callback is not None:
+                        progress_callback(len(results), total_files, result)
+        finally:
+            for store in (cache, embedding_cache, response_cache):
+                if store is not None:
+                    store.close()
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        print(f"Summarized {total_files} PDFs: " + ', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+        return sorted(results, key=lambda result: result['file'])
+
+    def summarize_pdfs(self, pdf_directory, output_directory, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size=8000, chunk_overlap=500, similarity_threshold=0.8, num_clusters=10, use_cache=True, cache_dir=None, workers=4):
         model_options = ["llama3-8b-8192", "llama3-70b-8192", "gpt-4o-mini", "gpt-4o", "gpt-4"]
     
         model_dropdown = widgets.Dropdown(
@@ -538,61 +1808,18 @@ class GoogleDriveHandler:
     
         process_button = widgets.Button(description="Start Processing")
         display(process_button)
+
+        def update_progress(done, total, result):
+            progress = int(done / total * 100)
+            progress_bar.value = progress
+            progress_bar.description = f'Progress: {progress}%'
     
         def on_button_click(b):
-            selected_model = model_dropdown.value
             status_label.value = "Processing... Please wait."
-        
-            pdf_files = [f for f in os.listdir(pdf_directory) if f.endswith('.pdf')]
-            total_files = len(pdf_files)
-        
-            for idx, pdf_filename in enumerate(pdf_files):
-                pdf_path = os.path.join(pdf_directory, pdf_filename)
-                output_path = os.path.join(output_directory, f"Summary-{os.path.splitext(pdf_filename)[0]}.docx")
-            
-                # Check if the summary already exists
-                if os.path.exists(output_path):
-                    print(f"Summary already exists for {pdf_filename}. Skipping...")
-                    continue
-            
-                text = self.extract_text_from_pdf(pdf_path)
-            
-                # Skip processing if extracted text is empty
-                if not text.strip():
-                    print(f"No text found in {pdf_filename}. Skipping...")
-                    continue
-            
-                combined_text, _ = self.extract_sections(text)
-                preprocessed_text = self.preprocess_text(combined_text)
-            
-                # Skip processing if preprocessed text is empty
-                if not preprocessed_text.strip():
-                    print(f"No meaningful text after preprocessing for {pdf_filename}. Skipping...")
-                    continue
-            
-                # Chunking the preprocessed text
-                chunks = self.chunk_text_with_langchain(preprocessed_text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            
-                # Skip embedding if there are no chunks
-                if not chunks:
-                    print(f"No chunks generated for {pdf_filename}. Skipping...")
-                    continue
-            
-                vectors = self.embed_chunks(chunks, VOYAGEAI_API_key)
-            
-                # Continue with the summarization if chunks and vectors are valid
-                summary = self.summarize_text(preprocessed_text, selected_model, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size, chunk_overlap, similarity_threshold, num_clusters)
-            
-                self.save_summary_as_docx(summary, output_path, pdf_filename)
-            
-                # Update progress bar
-                progress = int((idx + 1) / total_files * 100)
-                progress_bar.value = progress
-                progress_bar.description = f'Progress: {progress}%'
-        
-        status_label.value = "Processing complete. Summaries saved."
-        progress_bar.bar_style = 'success'
-        progress_bar.description = 'Complete'
+            self.summarize_directory(pdf_directory, output_directory, model_dropdown.value, prompt, OPENAI_API_KEY, GROQ_API_KEY, VOYAGEAI_API_key, chunk_size, chunk_overlap, similarity_threshold, num_clusters, workers=workers, use_cache=use_cache, cache_dir=cache_dir, progress_callback=update_progress)
+            status_label.value = "Processing complete. Summaries saved."
+            progress_bar.bar_style = 'success'
+            progress_bar.description = 'Complete'
     
         process_button.on_click(on_button_click)
 
@@ -602,35 +1829,85 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description='Google Drive Handler')
-    parser.add_argument('action', choices=['download_pdfs', 'upload_txt', 'convert_pdfs', 'convert_docx', 'download_txts', 'download_docs', 'run_app'], help='Action to perform')
-    parser.add_argument('folder_id', help='Google Drive folder ID')
+    parser.add_argument('action', choices=['download_pdfs', 'upload_txt', 'convert_pdfs', 'convert_docx', 'download_txts', 'download_docs', 'upload_docs', 'summarize_pdfs', 'run_app', 'cache_info', 'cache_clear'], help='Action to perform')
+    parser.add_argument('folder_id', nargs='?', help='Google Drive folder ID')
     parser.add_argument('--credentials', default='credentials.json', help='Path to credentials.json')
     parser.add_argument('--directory', default='.', help='Directory to process files in')
     parser.add_argument('--model', default='gpt-4', help='Model to use for summarization')
     parser.add_argument('--output', default='summary_folder', help='Output directory for summaries')
+    parser.add_argument('--prompt', default=DEFAULT_SUMMARY_PROMPT, help='System prompt for summarization')
+    parser.add_argument('--workers', type=int, default=1, help='Number of concurrent download/upload/summarization workers')
+    parser.add_argument('--chunk-size', type=int, default=DOWNLOAD_CHUNK_SIZE, help='Download chunk size in bytes')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes for convert_pdfs and convert_docx')
+    parser.add_argument('--split-pages', type=int, default=None, help='Split PDFs longer than this many pages across workers')
+    parser.add_argument('--sync', action='store_true', help='Only transfer files that changed since the last sync')
+    parser.add_argument('--recursive', action='store_true', help='Also download files in subfolders, mirrored as local subdirectories')
+    parser.add_argument('--verify', action='store_true', help='Check the checksums of uploaded files against Drive (always on with --sync)')
+
+    parser.add_argument('--cache-dir', default=None, help='Directory of the extraction cache')
+    parser.add_argument('--stage', default=None, help='Only clear this cache stage (text, sections, preprocessed, embeddings or responses)')
+    parser.add_argument('--profile', action='store_true', help='Print a per-stage latency/throughput breakdown at the end of the run')
+    parser.add_argument('--profile-log', default=None, help='Append every span and counter to this JSON lines file')
 
     args = parser.parse_args()
+    if args.action in DRIVE_ACTIONS and not args.folder_id:
+        parser.error(f'folder_id is required for {args.action}')
+    if args.sync and args.recursive:
+        parser.error('--sync and --recursive cannot be combined')
+
+    # Cache maintenance doesn't need Drive credentials
+    if args.action in ('cache_info', 'cache_clear'):
+        with ExtractionCache(args.cache_dir) as cache, EmbeddingCache(args.cache_dir) as embedding_cache, ResponseCache(args.cache_dir) as response_cache:
+            if args.action == 'cache_clear':
+                if args.stage in (None, 'embeddings'):
+                    embedding_cache.clear()
+                if args.stage in (None, 'responses'):
+                    response_cache.clear()
+                if args.stage not in ('embeddings', 'responses'):
+                    cache.clear(stage=args.stage)
+            stats = cache.stats()
+            embedding_stats = embedding_cache.stats()
+            response_stats = response_cache.stats()
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Entries: {stats['entries']} ({stats['bytes']} of {stats['max_bytes']} bytes)")
+        for stage, stage_stats in sorted(stats['stages'].items()):
+            print(f"  {stage}: {stage_stats['entries']} entries, {stage_stats['bytes']} bytes")
+        print(f"  embeddings: {embedding_stats['entries']} vectors, {embedding_stats['bytes']} bytes")
+        print(f"  responses: {response_stats['entries']} LLM responses, {response_stats['bytes']} bytes")
+        return
+
+    instrumentation = Instrumentation()
+    if args.profile_log:
+        instrumentation.add_sink(JsonlSink(args.profile_log))
+    handler = GoogleDriveHandler(credentials_path=args.credentials, instrumentation=instrumentation, connect=args.action not in LOCAL_ACTIONS)
+
+    try:
+        if args.action == 'download_pdfs':
+            handler.download_pdfs(args.folder_id, workers=args.workers, chunk_size=args.chunk_size, sync=args.sync, recursive=args.recursive)
+        elif args.action == 'upload_txt':
+            handler.upload_txt(args.folder_id, directory_path=args.directory, sync=args.sync, workers=args.workers, verify=args.verify)
+        elif args.action == 'convert_pdfs':
+            handler.process_pdfs_in_dir(args.directory, jobs=args.jobs, split_pages=args.split_pages)
+        elif args.action == 'convert_docx':
+            handler.convert_docx_to_txt(args.directory, jobs=args.jobs)
+        elif args.action == 'download_txts':
+            handler.download_txt(args.folder_id, save_dir=args.directory, workers=args.workers, chunk_size=args.chunk_size, sync=args.sync, recursive=args.recursive)
+        elif args.action == 'download_docs':
+            handler.download_docs(args.folder_id, save_dir=args.directory, workers=args.workers, chunk_size=args.chunk_size, sync=args.sync, recursive=args.recursive)
+        elif args.action == 'upload_docs':
+            handler.upload_docs(args.folder_id, directory_path=args.directory, sync=args.sync, workers=args.workers, verify=args.verify)
+        elif args.action == 'summarize_pdfs':
+            results = handler.summarize_directory(args.directory, args.output, args.model, args.prompt, os.getenv("My_OpenAI_API_key"), os.getenv("My_Groq_API_key"), os.getenv("My_voyageai_API_key"), workers=args.workers, cache_dir=args.cache_dir)
+            for result in results:
+                line = f"{result['file']}: {result['status']} ({result['seconds']:.1f}s)"
+                if 'error' in result:
+                    line += f" - {result['error']}"
+                print(line)
+    finally:
+        if args.profile:
+            print(instrumentation.report())
+        instrumentation.close()
 
-    handler = GoogleDriveHandler(credentials_path=args.credentials)
-    
-    
-    if args.action == 'download_pdfs':
-        handler.download_pdfs(args.folder_id)
-    elif args.action == 'upload_txt':
-        handler.upload_txt(args.folder_id, directory_path=args.directory)
-    elif args.action == 'convert_pdfs':
-        handler.process_pdfs_in_dir(args.directory)
-    elif args.action == 'convert_docx':
-        handler.convert_docx_to_txt(args.directory)
-    elif args.action == 'download_txts':
-        handler.download_txt(args.folder_id, save_dir=args.directory)
-    elif args.action == 'download_docs':
-        handler.download_docs(args.folder_id, save_dir=args.directory)
-    elif args.action == 'upload_docs':
-        handler.upload_docs(args.folder_id, directory_path=args.directory)
-    elif args.action == 'summaerize_pdfs':
-        handler.summarize_pdfs(args.directory, args.output, args.model, os.getenv("My_OpenAI_API_key"), os.getenv("My_Groq_API_key"), os.getenv("My_voyageai_API_key"))
-        
 
 if __name__ == '__main__':
     main()
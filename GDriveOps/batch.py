@@ -0,0 +1,79 @@
+#Coalesces Drive metadata calls into batch HTTP round trips
+import time
+import random
+from googleapiclient.errors import HttpError
+
+
+# Drive accepts at most 100 calls per batch request
+BATCH_LIMIT = 100
+BATCH_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class MetadataBatch:
+    # Collects metadata requests (files().get/list/create without media, ...)
+    # built on one Drive service and sends them batch_size at a time through
+    # service.new_batch_http_request. Calls rejected with 429/5xx inside a
+    # batch are resent in the next round with exponential backoff, since
+    # googleapiclient only retries whole requests, not parts of a batch.
+    def __init__(self, service, batch_size=BATCH_LIMIT, retries=BATCH_RETRIES, instrumentation=None):
+        self.service = service
+        self.batch_size = max(1, min(batch_size, BATCH_LIMIT))
+        self.retries = retries
+        self.instrumentation = instrumentation
+        self.requests = []
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, request):
+        self.requests.append(request)
+        return len(self.requests) - 1
+
+    def execute(self):
+        # Returns one entry per added request, in order: the response, or the
+        # HttpError that was left after the retries
+        results = [None] * len(self.requests)
+        pending = list(range(len(self.requests)))
+        attempt = 0
+        while pending:
+            retry = []
+            for start in range(0, len(pending), self.batch_size):
+                retry.extend(self._send(pending[start:start + self.batch_size], results))
+            if not retry or attempt >= self.retries:
+                break
+            if self.instrumentation is not None:
+                self.instrumentation.count('batch', 'retries', len(retry))
+            time.sleep(min(2 ** attempt + random.random(), 32))
+            attempt += 1
+            pending = retry
+        self.requests = []
+        return results
+
+    def _send(self, indices, results):
+        retry = []
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            results[index] = exception if exception is not None else response
+            if isinstance(exception, HttpError) and exception.resp.status in RETRY_STATUSES:
+                retry.append(index)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for index in indices:
+            batch.add(self.requests[index], request_id=str(index))
+        try:
+            if self.instrumentation is None:
+                batch.execute()
+            else:
+                with self.instrumentation.span('batch') as span:
+                    span['calls'] = len(indices)
+                    batch.execute()
+        except HttpError as e:
+            # The whole round trip failed, so every call in it is retried
+            if e.resp.status not in RETRY_STATUSES:
+                raise
+            for index in indices:
+                results[index] = e
+            return list(indices)
+        return retry
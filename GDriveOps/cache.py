@@ -0,0 +1,340 @@
+#On-disk cache for CPU-heavy document processing stages
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .lazy import LazyModule
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+np = LazyModule('numpy')
+
+
+# Bump when extraction, section splitting or preprocessing output changes
+EXTRACTOR_VERSION = '2'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'GDriveOps')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_RESPONSE_TTL = 30 * 24 * 60 * 60
+DEFAULT_RESPONSE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock shared by every process using the same cache directory
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ExtractionCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.environ.get('GDRIVEOPS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, 'extraction.sqlite'), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, stage TEXT, value TEXT, "
+                "size INTEGER, last_access REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def make_key(self, file_hash, stage, **params):
+        raw = json.dumps([file_hash, stage, EXTRACTOR_VERSION, params], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, stage, value):
+        encoded = json.dumps(value)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, stage, encoded, len(encoded), time.time())
+            )
+            self._evict()
+
+    def get_or_compute(self, file_hash, stage, compute, **params):
+        key = self.make_key(file_hash, stage, **params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, stage, value)
+        return value
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits its budget
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT stage, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY stage"
+            ).fetchall()
+        return {
+            'cache_dir': self.cache_dir,
+            'entries': sum(row[1] for row in rows),
+            'bytes': sum(row[2] for row in rows),
+            'max_bytes': self.max_bytes,
+            'stages': {row[0]: {'entries': row[1], 'bytes': row[2]} for row in rows},
+        }
+
+    def clear(self, stage=None):
+        with self.lock, self.conn:
+            if stage is None:
+                self.conn.execute("DELETE FROM entries")
+            else:
+                self.conn.execute("DELETE FROM entries WHERE stage = ?", (stage,))
+        self.conn.execute("VACUUM")
+
+
+class EmbeddingCache:
+    # Vectors are appended to one float32 file per (model, input_type) and read
+    # back through a memory map; SQLite maps chunk hashes to row numbers.
+    def __init__(self, cache_dir=None):
+        self.cache_dir = os.path.join(cache_dir or os.environ.get('GDRIVEOPS_CACHE_DIR', DEFAULT_CACHE_DIR), 'embeddings')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.maps = {}
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite'), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS stores ("
+                "model TEXT, input_type TEXT, dim INTEGER, rows INTEGER, "
+                "PRIMARY KEY (model, input_type))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "model TEXT, input_type TEXT, chunk_hash TEXT, row INTEGER, "
+                "PRIMARY KEY (model, input_type, chunk_hash))"
+            )
+
+    def close(self):
+        self.maps.clear()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _data_path(self, model, input_type):
+        safe_model = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model)
+        return os.path.join(self.cache_dir, f'{safe_model}-{input_type}.f32')
+
+    def _memmap(self, model, input_type, dim, rows):
+        cached = self.maps.get((model, input_type))
+        if cached is None or cached.shape[0] != rows:
+            cached = np.memmap(self._data_path(model, input_type), dtype=np.float32, mode='r', shape=(rows, dim))
+            self.maps[(model, input_type)] = cached
+        return cached
+
+    def lookup(self, model, input_type, texts):
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self.lock:
+            store = self.conn.execute(
+                "SELECT dim, rows FROM stores WHERE model = ? AND input_type = ?", (model, input_type)
+            ).fetchone()
+            if store is None:
+                return found
+            rows = {}
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows.update(self.conn.execute(
+                    f"SELECT chunk_hash, row FROM vectors WHERE model = ? AND input_type = ? "
+                    f"AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    [model, input_type] + batch
+                ).fetchall())
+            vectors = self._memmap(model, input_type, *store)
+            for i, chunk_hash in enumerate(hashes):
+                if chunk_hash in rows:
+                    found[i] = vectors[rows[chunk_hash]]
+        return found
+
+    def add(self, model, input_type, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(texts)} texts")
+        if len(texts) == 0:
+            return
+        data_path = self._data_path(model, input_type)
+        # The store row count is read and advanced under a lock held across
+        # processes, and the commit happens before the lock is released
+        with self.lock, file_lock(data_path + '.lock'), self.conn:
+            store = self.conn.execute(
+                "SELECT dim, rows FROM stores WHERE model = ? AND input_type = ?", (model, input_type)
+            ).fetchone()
+            dim, rows = store if store else (vectors.shape[1], 0)
+            if vectors.shape[1] != dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cached dimension {dim} for {model}")
+            with open(data_path, 'r+b' if os.path.exists(data_path) else 'wb') as f:
+                # Row numbers come from the stores table, so drop any bytes
+                # past the last committed row (e.g. from a crash before commit)
+                f.truncate(rows * dim * 4)
+                f.seek(rows * dim * 4)
+                f.write(vectors.tobytes())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+                [(model, input_type, text_hash(text), rows + i) for i, text in enumerate(texts)]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stores VALUES (?, ?, ?, ?)",
+                (model, input_type, dim, rows + len(texts))
+            )
+
+    def stats(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT model, input_type, dim, rows FROM stores").fetchall()
+        return {
+            'entries': sum(row[3] for row in rows),
+            'bytes': sum(row[2] * row[3] * 4 for row in rows),
+        }
+
+    def clear(self):
+        with self.lock, self.conn:
+            for model, input_type in self.conn.execute("SELECT model, input_type FROM stores").fetchall():
+                data_path = self._data_path(model, input_type)
+                for path in (data_path, data_path + '.lock'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.conn.execute("DELETE FROM stores")
+            self.conn.execute("DELETE FROM vectors")
+            self.maps.clear()
+
+
+class ResponseCache:
+    # LLM responses keyed by everything that determines them: model,
+    # temperature, system prompt and the hash of the input text. Entries
+    # expire after ttl seconds and least recently used ones are evicted
+    # past max_bytes.
+    def __init__(self, cache_dir=None, ttl=DEFAULT_RESPONSE_TTL, max_bytes=DEFAULT_RESPONSE_MAX_BYTES):
+        self.cache_dir = cache_dir or os.environ.get('GDRIVEOPS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, 'responses.sqlite'), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "size INTEGER, created REAL, last_access REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def make_key(self, model, temperature, system_prompt, text):
+        raw = json.dumps([model, temperature, system_prompt, text_hash(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, model, temperature, system_prompt, text):
+        key = self.make_key(model, temperature, system_prompt, text)
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, model, temperature, system_prompt, text, response):
+        key = self.make_key(model, temperature, system_prompt, text)
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes, 'ttl': self.ttl}
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+        self.conn.execute("VACUUM")
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -0,0 +1,131 @@
+#Spans and counters describing where pipeline time goes
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class MemorySink:
+    # Keeps every event in a list, e.g. for tests or a notebook session
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def emit(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    # Appends one JSON object per event to a file
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, event):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Instrumentation:
+    # Every span and counter is aggregated per stage and forwarded to the
+    # sinks. Spans yield a dict that the caller fills with counters such as
+    # bytes, pages or tokens; they are reported with the span's duration.
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stage(self, stage):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = {'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'counters': {}}
+            self.stages[stage] = stats
+        return stats
+
+    def _emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        counters = {}
+        error = None
+        start = time.perf_counter()
+        try:
+            yield counters
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                stats = self._stage(stage)
+                stats['calls'] += 1
+                stats['errors'] += error is not None
+                stats['seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+                for name, value in counters.items():
+                    stats['counters'][name] = stats['counters'].get(name, 0) + value
+            event = {'type': 'span', 'stage': stage, 'time': time.time(), 'seconds': seconds, 'counters': counters}
+            event.update(attrs)
+            if error is not None:
+                event['error'] = str(error)
+            self._emit(event)
+
+    def count(self, stage, name, value=1, **attrs):
+        with self.lock:
+            counters = self._stage(stage)['counters']
+            counters[name] = counters.get(name, 0) + value
+        event = {'type': 'counter', 'stage': stage, 'time': time.time(), 'name': name, 'value': value}
+        event.update(attrs)
+        self._emit(event)
+
+    def summary(self):
+        with self.lock:
+            return {stage: dict(stats, counters=dict(stats['counters'])) for stage, stats in self.stages.items()}
+
+    def report(self):
+        # Seconds are summed over spans, so concurrent stages can add up to
+        # more than the wall-clock time of the run
+        lines = [f"{'stage':<16}{'calls':>7}{'errors':>8}{'total s':>10}{'mean s':>9}{'max s':>9}  counters (per second)"]
+        for stage, stats in sorted(self.summary().items(), key=lambda item: -item[1]['seconds']):
+            mean = stats['seconds'] / stats['calls'] if stats['calls'] else 0.0
+            counters = ', '.join(
+                f"{name}={value:,}" + (f" ({value / stats['seconds']:,.1f}/s)" if stats['seconds'] > 0 else '')
+                for name, value in sorted(stats['counters'].items())
+            )
+            lines.append(
+                f"{stage:<16}{stats['calls']:>7}{stats['errors']:>8}{stats['seconds']:>10.3f}"
+                f"{mean:>9.3f}{stats['max_seconds']:>9.3f}  {counters}"
+            )
+        return '\n'.join(lines)
+
+
+def counted(items, counters, name):
+    # Passes items through while counting them into a span's counters
+    for item in items:
+        counters[name] = counters.get(name, 0) + 1
+        yield item
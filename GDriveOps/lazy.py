@@ -0,0 +1,43 @@
+#Deferred imports for the optional ML/notebook stack
+import importlib
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+class LazyAttribute:
+    # Stands in for "from module import name"; the import happens on the
+    # first call or attribute access
+    def __init__(self, module_name, attr):
+        self._module_name = module_name
+        self._attr = attr
+        self._value = None
+
+    def _load(self):
+        if self._value is None:
+            self._value = getattr(importlib.import_module(self._module_name), self._attr)
+        return self._value
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy '{self._module_name}.{self._attr}'>"
@@ -0,0 +1,110 @@
+#Local sync manifest used for incremental folder syncs
+import os
+import hashlib
+import sqlite3
+import threading
+
+
+MANIFEST_FILENAME = '.gdriveops_manifest.sqlite'
+
+
+def file_md5(path, block_size=1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id TEXT PRIMARY KEY, folder_id TEXT, name TEXT, "
+                "md5 TEXT, modified_time TEXT, size INTEGER)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "folder_id TEXT, name TEXT, file_id TEXT, md5 TEXT, "
+                "PRIMARY KEY (folder_id, name))"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, file_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_id, folder_id, name, md5, modified_time, size FROM files WHERE file_id = ?",
+                (file_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'folder_id', 'name', 'md5Checksum', 'modifiedTime', 'size'), row))
+
+    def is_current(self, item):
+        entry = self.get(item['id'])
+        if entry is None or entry['name'] != item['name']:
+            return False
+        # Google Docs formats have no md5Checksum, so fall back to modifiedTime/size
+        if item.get('md5Checksum'):
+            return entry['md5Checksum'] == item['md5Checksum']
+        return (entry['modifiedTime'] == item.get('modifiedTime')
+                and entry['size'] == _as_int(item.get('size')))
+
+    def record(self, item, folder_id):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (item['id'], folder_id, item['name'], item.get('md5Checksum'),
+                 item.get('modifiedTime'), _as_int(item.get('size')))
+            )
+
+    def remove(self, file_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+    def get_upload(self, folder_id, name):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_id, md5 FROM uploads WHERE folder_id = ? AND name = ?",
+                (folder_id, name)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'md5Checksum': row[1]}
+
+    def record_upload(self, folder_id, name, file_id, md5):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)",
+                (folder_id, name, file_id, md5)
+            )
+
+    def remove_upload(self, folder_id, name):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM uploads WHERE folder_id = ? AND name = ?", (folder_id, name))
+
+    def get_state(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+
+def _as_int(value):
+    return int(value) if value is not None else None
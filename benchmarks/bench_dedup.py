@@ -0,0 +1,60 @@
+#Compare the vectorized redundancy filter with the original per-chunk loop
+#Usage: python -m benchmarks.bench_dedup [--n 10000] [--dim 1024]
+import argparse
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from GDriveOps.GDhandler import dedup_indices
+
+
+def reference_dedup(vectors, similarity_threshold=0.8):
+    # The implementation filter_redundant_chunks used before vectorization
+    unique_indices = []
+    unique_vectors = []
+    for i, vector in enumerate(vectors):
+        if len(unique_vectors) == 0:
+            unique_indices.append(i)
+            unique_vectors.append(vector)
+        else:
+            similarities = cosine_similarity([vector], unique_vectors)
+            if max(similarities[0]) < similarity_threshold:
+                unique_indices.append(i)
+                unique_vectors.append(vector)
+    return unique_indices
+
+
+def synthetic_vectors(n, dim, duplicate_fraction=0.3, seed=42):
+    rng = np.random.default_rng(seed)
+    n_duplicates = int(n * duplicate_fraction)
+    base = rng.normal(size=(n - n_duplicates, dim)).astype(np.float32)
+    sources = rng.integers(0, len(base), size=n_duplicates)
+    duplicates = base[sources] + rng.normal(scale=0.1, size=(n_duplicates, dim)).astype(np.float32)
+    vectors = np.vstack([base, duplicates])
+    return vectors[rng.permutation(n)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redundancy filter benchmark')
+    parser.add_argument('--n', type=int, default=10000, help='Number of vectors')
+    parser.add_argument('--dim', type=int, default=1024, help='Vector dimension')
+    parser.add_argument('--skip-reference', action='store_true', help='Only time the vectorized filter')
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.n, args.dim)
+    kept, seconds = timed(dedup_indices, vectors)
+    print(f"vectorized: {seconds:.3f}s, kept {len(kept)} of {args.n}")
+
+    if not args.skip_reference:
+        reference, reference_seconds = timed(reference_dedup, vectors)
+        print(f"reference:  {reference_seconds:.3f}s, kept {len(reference)} of {args.n}")
+        print(f"speedup:    {reference_seconds / seconds:.1f}x, identical selection: {list(kept) == reference}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#Compare the streaming DOCX text extractor with the python-docx path
+#Usage: python -m benchmarks.bench_docx [--paragraphs 20000] [--files 8] [--jobs 4]
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from docx import Document
+from GDriveOps.GDhandler import iter_docx_paragraphs, convert_docx_job
+
+
+def python_docx_text(path):
+    # The implementation docx_to_text used before the streaming extractor
+    doc = Document(path)
+    return '\n'.join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def xml_text(path):
+    return '\n'.join(iter_docx_paragraphs(path))
+
+
+def make_docx(path, paragraphs, table_rows=200):
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f'Paragraph {i}: the quick brown fox jumps over the lazy dog. ' * 3)
+    table = doc.add_table(rows=table_rows, cols=4)
+    for i, cell in enumerate(table._cells):
+        cell.text = f'cell {i}'
+    doc.save(path)
+
+
+def measure(label, func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    text = func(path)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<14} {seconds:8.3f}s  peak {peak / 1024 / 1024:8.1f} MB  {len(text):,} chars")
+    return seconds
+
+
+def convert_directory(directory, jobs):
+    from concurrent.futures import ProcessPoolExecutor
+    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.docx')]
+    start = time.perf_counter()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(convert_docx_job, files, [f[:-5] + '.txt' for f in files]))
+    else:
+        for f in files:
+            convert_docx_job(f, f[:-5] + '.txt')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DOCX extraction benchmark')
+    parser.add_argument('--paragraphs', type=int, default=20000, help='Paragraphs in the generated document')
+    parser.add_argument('--files', type=int, default=8, help='Documents in the directory conversion run')
+    parser.add_argument('--jobs', type=int, default=4, help='Worker processes for the directory conversion run')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'doc0.docx')
+        make_docx(path, args.paragraphs)
+        print(f"{args.paragraphs:,} paragraphs, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        baseline = measure('python-docx', python_docx_text, path)
+        fast = measure('streaming xml', xml_text, path)
+        print(f"speedup: {baseline / fast:.1f}x")
+
+        for i in range(1, args.files):
+            shutil.copy(path, os.path.join(directory, f'doc{i}.docx'))
+        serial = convert_directory(directory, 1)
+        parallel = convert_directory(directory, args.jobs)
+        print(f"convert {args.files} files: {serial:.3f}s serial, {parallel:.3f}s with {args.jobs} processes")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
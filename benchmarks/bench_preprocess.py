@@ -0,0 +1,94 @@
+#Tokens/second of preprocess_text before and after the fast path
+#Usage: python -m benchmarks.bench_preprocess [--scale 50] [--jobs 4]
+#Requires the NLTK punkt and wordnet data to be installed locally.
+import argparse
+import os
+import re
+import string
+import time
+import nltk
+from nltk.stem import WordNetLemmatizer
+from docx import Document
+from GDriveOps.GDhandler import preprocess_document, iter_pdf_pages, lemmatize_word
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'files')
+
+
+def reference_preprocess(text):
+    # The implementation preprocess_text used before the fast path
+    lemmatizer = WordNetLemmatizer()
+    sentences = nltk.sent_tokenize(text)
+    punctuation = set(string.punctuation)
+
+    processed_sentences = []
+    for sent in sentences:
+        words = nltk.word_tokenize(sent)
+        filtered_words = [
+            lemmatizer.lemmatize(word.lower())
+            for word in words
+            if word.lower() not in punctuation and word.isalpha()
+        ]
+        processed_sentences.append(' '.join(filtered_words))
+
+    processed_text = ' '.join(processed_sentences)
+    processed_text = re.sub(r'\d+', '', processed_text)
+
+    return processed_text
+
+
+def load_corpus():
+    texts = []
+    for file_name in sorted(os.listdir(FILES_DIR)):
+        path = os.path.join(FILES_DIR, file_name)
+        if file_name.endswith('.pdf'):
+            texts.append(''.join(iter_pdf_pages(path)))
+        elif file_name.endswith('.docx'):
+            texts.append('\n'.join(paragraph.text for paragraph in Document(path).paragraphs))
+        elif file_name.endswith('.txt'):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+    return texts
+
+
+def bench(label, func, documents, tokens):
+    start = time.perf_counter()
+    func(documents)
+    seconds = time.perf_counter() - start
+    print(f"{label:<22} {seconds:8.3f}s  {tokens / seconds:12,.0f} tokens/s")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocessing throughput benchmark')
+    parser.add_argument('--scale', type=int, default=50, help='Number of copies of the tests/files corpus')
+    parser.add_argument('--jobs', type=int, default=4, help='Worker processes for the batch run')
+    args = parser.parse_args()
+    try:
+        nltk.data.find('tokenizers/punkt')
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        parser.exit(1, "The NLTK punkt and wordnet data are required: python -m nltk.downloader punkt wordnet\n")
+
+    documents = load_corpus() * args.scale
+    tokens = sum(len(document.split()) for document in documents)
+    print(f"{len(documents)} documents, {tokens:,} whitespace tokens")
+
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    baseline = bench('reference', lambda docs: [reference_preprocess(d) for d in docs], documents, tokens)
+    lemmatize_word.cache_clear()
+    bench('nltk + lemma cache', lambda docs: [preprocess_document(d) for d in docs], documents, tokens)
+    lemmatize_word.cache_clear()
+    fast = bench('regex + lemma cache', lambda docs: [preprocess_document(d, tokenizer='regex') for d in docs], documents, tokens)
+
+    def batch(docs):
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            return list(executor.map(partial(preprocess_document, tokenizer='regex'), docs, chunksize=4))
+
+    parallel = bench(f'regex, {args.jobs} processes', batch, documents, tokens)
+    print(f"speedup: {baseline / fast:.1f}x single process, {baseline / parallel:.1f}x with {args.jobs} processes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import pytest
+from GDriveOps.GDhandler import GoogleDriveHandler
+from tests.fake_drive import FakeDriveService, FakeEmbeddingClient, FakeChain
+
+# Simulated round-trip time of one Drive API call or downloaded chunk
+DRIVE_LATENCY = 0.002
+
+
+@pytest.fixture
+def drive():
+    return FakeDriveService(latency=DRIVE_LATENCY)
+
+
+@pytest.fixture
+def handler(mocker, drive):
+    mocker.patch.object(GoogleDriveHandler, 'create_service', return_value=drive)
+    mocker.patch.object(GoogleDriveHandler, 'build_service', return_value=drive)
+    return GoogleDriveHandler()
+
+
+@pytest.fixture
+def model_backends(mocker, handler):
+    # Fake embedding and LLM backends with a fixed per-call latency; tokens
+    # are estimated from length so no tiktoken encoding is downloaded
+    embeddings = FakeEmbeddingClient(latency=0.005)
+    chain = FakeChain(latency=0.01)
+    mocker.patch.object(handler, 'get_voyage_client', return_value=embeddings)
+    mocker.patch.object(handler, 'get_chain', return_value=chain)
+    mocker.patch('GDriveOps.GDhandler.get_token_encoder', return_value=None)
+    handler.rate_limits.update(groq=60000, openai=60000)
+    return embeddings, chain
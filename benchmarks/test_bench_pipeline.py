@@ -0,0 +1,100 @@
+#Offline throughput benchmarks for listing, transfers, extraction, dedup and
+#summarization against the in-process Drive and model stand-ins
+#Usage: pytest benchmarks [--benchmark-compare] [--benchmark-autosave]
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from GDriveOps.GDhandler import clear_token_counts, dedup_indices
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'files')
+FILE_SIZE = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def fill_folder(drive, folder_id, count, size=FILE_SIZE, mime_type='application/pdf'):
+    for i in range(count):
+        drive.add_file(folder_id, f'file{i}.pdf', bytes([i % 256]) * size, mime_type=mime_type)
+
+
+def test_bench_list_folder(benchmark, handler, drive):
+    fill_folder(drive, 'big', 5000, size=1)
+    files = benchmark(handler.get_files_in_folder_with_query, "'big' in parents", page_size=1000)
+    assert len(files) == 5000
+
+
+def test_bench_list_subfolders(benchmark, handler, drive):
+    for i in range(300):
+        sub = drive.add_folder('tree', f'sub{i}')
+        drive.add_file(sub['id'], f'file{i}.pdf', b'x', mime_type='application/pdf')
+    files = benchmark(lambda: list(handler.iter_folder('tree', mime_types=['application/pdf'], recursive=True)))
+    assert len(files) == 300
+
+
+def test_bench_metadata_lookup(benchmark, handler, drive):
+    ids = [drive.add_file('meta', f'file{i}.txt', b'x')['id'] for i in range(500)]
+    metadata = benchmark(handler.get_metadata, ids, fields='id, md5Checksum')
+    assert len(metadata) == 500
+
+
+@pytest.mark.parametrize('workers', [1, 8])
+def test_bench_download(benchmark, handler, drive, workers):
+    fill_folder(drive, 'pdfs', 40)
+    items = handler.get_files_in_folder_with_query("'pdfs' in parents", page_size=1000)
+    directories = []
+
+    def setup():
+        directories.append(tempfile.mkdtemp())
+        return (items, directories[-1]), {'workers': workers, 'chunk_size': CHUNK_SIZE}
+
+    try:
+        results = benchmark.pedantic(handler.download_items, setup=setup, rounds=3)
+    finally:
+        for directory in directories:
+            shutil.rmtree(directory)
+    assert len(results['downloaded']) == 40
+    benchmark.extra_info['bytes'] = 40 * FILE_SIZE
+
+
+@pytest.mark.parametrize('workers', [1, 8])
+def test_bench_upload(benchmark, handler, tmp_path, workers):
+    for i in range(40):
+        (tmp_path / f'file{i}.txt').write_bytes(b'x' * FILE_SIZE)
+    tasks = [(f'file{i}.txt', None) for i in range(40)]
+    results = benchmark.pedantic(handler.upload_items, args=(tasks, 'texts', str(tmp_path)), kwargs={'workers': workers}, rounds=3)
+    assert len(results['uploaded']) == 40
+    benchmark.extra_info['bytes'] = 40 * FILE_SIZE
+
+
+def test_bench_extract_pdf(benchmark, handler):
+    text = benchmark(handler.convert_pdf_to_text, os.path.join(FILES_DIR, 'Diabetes.pdf'))
+    assert text
+
+
+def test_bench_extract_docx(benchmark, handler):
+    text = benchmark(handler.docx_to_text, os.path.join(FILES_DIR, 'Diabetes.docx'))
+    assert text
+
+
+def test_bench_dedup(benchmark):
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(1400, 256)).astype(np.float32)
+    vectors = np.vstack([base, base[:600] + rng.normal(scale=0.1, size=(600, 256)).astype(np.float32)])
+    keep = benchmark(dedup_indices, vectors)
+    assert len(keep) == 1400
+
+
+def test_bench_summarize_text(benchmark, handler, model_backends):
+    embeddings, chain = model_backends
+    with open(os.path.join(FILES_DIR, 'DIABETES DATA.txt'), encoding='utf-8') as f:
+        text = f.read() * 5
+
+    def run():
+        clear_token_counts()
+        return handler.summarize_text(text, 'llama3-8b-8192', 'Summarize.', None, None, 'key', chunk_size=2000, chunk_overlap=100)
+
+    summary = benchmark.pedantic(run, rounds=3, warmup_rounds=1)
+    assert summary.startswith('summary of')
+    benchmark.extra_info['llm_calls'] = chain.calls
+    benchmark.extra_info['embedding_calls'] = embeddings.calls
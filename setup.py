@@ -21,6 +21,7 @@ setup(
         'langchain-groq',
         'langchain-core',
         'scikit-learn',
+        'tiktoken',
         'rouge-score',  
     ],
     dependency_links=[
@@ -44,5 +45,5 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.9',
 )
\ No newline at end of file
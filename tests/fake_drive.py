@@ -0,0 +1,266 @@
+#In-process stand-ins for the Drive API and the embedding/LLM backends, used
+#by the offline tests and the benchmark suite
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+from httplib2 import Response
+from googleapiclient.errors import HttpError
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+PARENT_PATTERN = re.compile(r"'([^']+)' in parents")
+MIMETYPE_PATTERN = re.compile(r"mimeType\s*=\s*'([^']+)'")
+NAME_PATTERN = re.compile(r"name\s*=\s*'([^']+)'")
+FIELDS_PATTERN = re.compile(r'files\(([^)]*)\)')
+
+
+class FakeRequest:
+    # Mimics googleapiclient's HttpRequest for calls that return JSON
+    def __init__(self, service, handler):
+        self.service = service
+        self.handler = handler
+        self.resumable = None
+
+    def execute(self, num_retries=0, http=None):
+        self.service.wait()
+        return self.handler()
+
+
+class FakeBatchRequest:
+    # Mimics BatchHttpRequest: every added call is answered in one round trip
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) >= 100:
+            raise ValueError('Drive batches are limited to 100 calls')
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self, http=None):
+        self.service.count('batch')
+        self.service.wait()
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = request.handler(), None
+            except HttpError as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class FakeMediaHttp:
+    # Serves "Range: bytes=a-b" requests the way stream_to_file issues them
+    def __init__(self, service):
+        self.service = service
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        self.service.wait()
+        content = self.service.files_by_id[uri.rsplit('/', 1)[1]]['content']
+        start, end = (int(value) for value in headers['range'].split('=')[1].split('-'))
+        body = content[start:end + 1]
+        with self.service.lock:
+            self.service.bytes_served += len(body)
+        end = start + len(body) - 1
+        return Response({'status': 206, 'content-range': f'bytes {start}-{end}/{len(content)}'}), body
+
+
+class FakeMediaRequest:
+    def __init__(self, service, file_id):
+        self.http = FakeMediaHttp(service)
+        self.uri = f'fake://drive/{file_id}'
+        self.headers = {}
+
+
+class FakeFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, q='', spaces='drive', fields='nextPageToken, files(id, name)', pageToken=None, pageSize=100, **kwargs):
+        def run():
+            matches = self.service.query(q)
+            start = int(pageToken or 0)
+            size = min(pageSize, self.service.max_page_size)
+            page = matches[start:start + size]
+            result = {'files': [self.service.project(item, fields) for item in page]}
+            if start + size < len(matches):
+                result['nextPageToken'] = str(start + size)
+            return result
+        self.service.count('list')
+        return FakeRequest(self.service, run)
+
+    def get(self, fileId, fields='id, name', **kwargs):
+        self.service.count('get')
+        def run():
+            item = self.service.files_by_id.get(fileId)
+            if item is None:
+                raise HttpError(Response({'status': 404}), b'File not found', uri=f'fake://drive/{fileId}')
+            return self.service.project(item, f'files({fields})')
+        return FakeRequest(self.service, run)
+
+    def get_media(self, fileId, **kwargs):
+        self.service.count('get_media')
+        return FakeMediaRequest(self.service, fileId)
+
+    def create(self, body, media_body=None, fields='id', **kwargs):
+        def run():
+            content = media_body.getbytes(0, media_body.size()) if media_body is not None else b''
+            parent = body.get('parents', ['root'])[0]
+            item = self.service.add_file(parent, body['name'], content, mime_type=body.get('mimeType') or (media_body.mimetype() if media_body is not None else None))
+            return self.service.project(item, f'files({fields})')
+        self.service.count('create')
+        return FakeRequest(self.service, run)
+
+    def update(self, fileId, media_body=None, fields='id', **kwargs):
+        def run():
+            if fileId not in self.service.files_by_id:
+                raise HttpError(Response({'status': 404}), b'File not found', uri=f'fake://drive/{fileId}')
+            content = media_body.getbytes(0, media_body.size())
+            return self.service.project(self.service.replace_content(fileId, content), f'files({fields})')
+        self.service.count('update')
+        return FakeRequest(self.service, run)
+
+
+class FakeChanges:
+    def __init__(self, service):
+        self.service = service
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self.service, lambda: {'startPageToken': str(len(self.service.change_log))})
+
+    def list(self, pageToken, pageSize=100, fields=None, **kwargs):
+        def run():
+            start = int(pageToken)
+            changes = self.service.change_log[start:start + pageSize]
+            result = {'changes': [{'fileId': item['id'], 'removed': False, 'file': self.service.project(item, None)} for item in changes]}
+            if start + pageSize < len(self.service.change_log):
+                result['nextPageToken'] = str(start + pageSize)
+            else:
+                result['newStartPageToken'] = str(len(self.service.change_log))
+            return result
+        return FakeRequest(self.service, run)
+
+
+class FakeDriveService:
+    # Holds files in memory. latency is added to every API call and every
+    # downloaded chunk; max_page_size caps pageSize like the real API.
+    def __init__(self, latency=0.0, max_page_size=1000):
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.lock = threading.Lock()
+        self.files_by_id = {}
+        self.change_log = []
+        self.calls = {}
+        self.bytes_served = 0
+        self.next_id = 0
+
+    def files(self):
+        return FakeFiles(self)
+
+    def changes(self):
+        return FakeChanges(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count(self, call):
+        with self.lock:
+            self.calls[call] = self.calls.get(call, 0) + 1
+
+    def add_file(self, folder_id, name, content=b'', mime_type=None, file_id=None):
+        with self.lock:
+            if file_id is None:
+                self.next_id += 1
+                file_id = f'file{self.next_id}'
+            item = {
+                'id': file_id,
+                'name': name,
+                'mimeType': mime_type or 'application/octet-stream',
+                'parents': [folder_id],
+                'trashed': False,
+            }
+            self.files_by_id[file_id] = item
+        self.set_content(item, content)
+        return item
+
+    def add_folder(self, parent_id, name):
+        return self.add_file(parent_id, name, mime_type=FOLDER_MIMETYPE)
+
+    def replace_content(self, file_id, content):
+        item = self.files_by_id[file_id]
+        self.set_content(item, content)
+        return item
+
+    def set_content(self, item, content):
+        with self.lock:
+            item['content'] = content
+            item['size'] = str(len(content))
+            item['md5Checksum'] = hashlib.md5(content).hexdigest()
+            item['modifiedTime'] = f'2024-01-01T00:00:{len(self.change_log) % 60:02d}.000Z'
+            self.change_log.append(item)
+
+    def query(self, q):
+        parents = PARENT_PATTERN.findall(q)
+        mime_types = MIMETYPE_PATTERN.findall(q)
+        names = NAME_PATTERN.findall(q)
+        with self.lock:
+            items = list(self.files_by_id.values())
+        return [
+            item for item in items
+            if not item['trashed']
+            and (not parents or parents[0] in item['parents'])
+            and (not mime_types or item['mimeType'] in mime_types)
+            and (not names or item['name'] in names)
+        ]
+
+    def project(self, item, fields):
+        # Returns only the fields requested in a "files(a, b)" projection
+        match = FIELDS_PATTERN.search(fields or '')
+        if match is None:
+            return {key: value for key, value in item.items() if key != 'content'}
+        names = [name.strip() for name in match.group(1).split(',') if name.strip()]
+        return {name: item[name] for name in names if name in item}
+
+
+def fake_vector(text, dim=64):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+
+
+class EmbeddingResult:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class FakeEmbeddingClient:
+    # Deterministic stand-in for voyageai.Client
+    def __init__(self, latency=0.0, dim=64):
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+
+    def embed(self, texts, model=None, input_type=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return EmbeddingResult([fake_vector(text, self.dim).tolist() for text in texts])
+
+
+class FakeChain:
+    # Stand-in for the LLMChain built by get_chain
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def run(self, text):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f'summary of {len(text.split())} words'
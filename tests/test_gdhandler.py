@@ -2,11 +2,39 @@ import pytest
 import os
 from unittest.mock import MagicMock, patch, mock_open
 from GDriveOps.GDhandler import GoogleDriveHandler
+from tests.fake_drive import FakeDriveService
 
 @pytest.fixture
-def handler():
+def drive():
+    return FakeDriveService()
+
+@pytest.fixture
+def handler(mocker, drive):
+    # Runs against the in-process Drive stand-in, so no credentials or network
+    mocker.patch.object(GoogleDriveHandler, 'create_service', return_value=drive)
+    mocker.patch.object(GoogleDriveHandler, 'build_service', return_value=drive)
+    return GoogleDriveHandler()
+
+@pytest.fixture
+def offline_handler(mocker):
+    mocker.patch.object(GoogleDriveHandler, 'create_service', return_value=MagicMock())
+    mocker.patch.object(GoogleDriveHandler, 'build_service', side_effect=lambda: MagicMock())
     return GoogleDriveHandler()
 
+@pytest.fixture
+def word_tokens(mocker):
+    # tiktoken downloads its encodings on first use, so tests count words
+    from GDriveOps.GDhandler import clear_token_counts
+
+    class WordEncoder:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    mocker.patch('GDriveOps.GDhandler.get_token_encoder', return_value=WordEncoder())
+    clear_token_counts()
+    yield
+    clear_token_counts()
+
 def find_file_with_extension(directory, extension):
     for filename in os.listdir(directory):
         if filename.endswith(extension):
@@ -25,6 +53,17 @@ def test_convert_pdf_to_text(mocker, handler):
     text = handler.convert_pdf_to_text(pdf_file)
     assert "Diabetes is a disease" in text  # Match the actual content
 
+def test_iter_pdf_pages_limits_and_streams(offline_handler, tmp_path):
+    pdf_file = find_file_with_extension('tests/files', '.pdf')
+    pages = list(offline_handler.iter_pdf_pages(pdf_file, start=1, max_pages=2))
+    assert len(pages) == 2
+    assert offline_handler.convert_pdf_to_text(pdf_file, start=1, stop=3) == ''.join(pages)
+
+    output_path = str(tmp_path / 'out.txt')
+    offline_handler.convert_pdf_to_text(pdf_file, output_path=output_path)
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == offline_handler.extract_text_from_pdf(pdf_file)
+
 def test_process_pdfs_in_dir(mocker, handler):
     pdf_file = find_file_with_extension('tests/files', '.pdf')
     pdf_name = os.path.basename(pdf_file)
@@ -33,10 +72,532 @@ def test_process_pdfs_in_dir(mocker, handler):
     mocker.patch('GDriveOps.GDhandler.os.listdir', return_value=[pdf_name])
     mocker.patch.object(handler, 'convert_pdf_to_text', return_value='Sample text from PDF')
 
+    replace = mocker.patch('GDriveOps.GDhandler.os.replace')
+    output_path = os.path.join('tests/files', txt_file)
+
     with patch('builtins.open', mock_open()) as mock_file:
         handler.process_pdfs_in_dir('tests/files')
         handler.convert_pdf_to_text.assert_called_with(pdf_file)
-        mock_file.assert_called_with(os.path.join('tests/files', txt_file), 'w', encoding='utf-8')
+        mock_file.assert_called_with(output_path + '.tmp', 'w', encoding='utf-8')
+        mock_file().write.assert_called_with('Sample text from PDF')
+        replace.assert_called_with(output_path + '.tmp', output_path)
+
+def test_write_pages_atomic_removes_temp_file_on_failure(tmp_path):
+    from GDriveOps.GDhandler import write_pages_atomic
+    output_path = str(tmp_path / 'out.txt')
+    write_pages_atomic(output_path, ['old'])
+
+    def failing_pages():
+        yield 'new page'
+        raise RuntimeError('range failed')
+
+    with pytest.raises(RuntimeError):
+        write_pages_atomic(output_path, failing_pages())
+    assert os.listdir(tmp_path) == ['out.txt']
+    assert (tmp_path / 'out.txt').read_text(encoding='utf-8') == 'old'
+
+def test_process_pdfs_in_dir_parallel(offline_handler, tmp_path):
+    handler = offline_handler
+    import shutil
+    pdf_file = find_file_with_extension('tests/files', '.pdf')
+    shutil.copy(pdf_file, tmp_path / 'whole.pdf')
+    shutil.copy(pdf_file, tmp_path / 'split.pdf')
+    (tmp_path / 'broken.pdf').write_bytes(b'not a pdf')
+
+    report = handler.process_pdfs_in_dir(str(tmp_path), jobs=2, split_pages=5)
+    assert sorted(report['converted']) == ['split.pdf', 'whole.pdf']
+    assert list(report['failed']) == ['broken.pdf']
+    expected = handler.convert_pdf_to_text(pdf_file)
+    assert (tmp_path / 'whole.txt').read_text(encoding='utf-8') == expected
+    assert (tmp_path / 'split.txt').read_text(encoding='utf-8') == expected
+
+def test_docx_xml_extraction_matches_python_docx_and_keeps_tables(offline_handler, tmp_path):
+    import shutil
+    from docx import Document
+    docx_file = find_file_with_extension('tests/files', '.docx')
+    assert offline_handler.docx_to_text(docx_file) == offline_handler.docx_to_text(docx_file, method='python-docx')
+
+    doc = Document()
+    paragraph = doc.add_paragraph('Intro')
+    paragraph.add_run('\tend').add_break()
+    table = doc.add_table(rows=2, cols=2)
+    for i, cell in enumerate(table._cells):
+        cell.text = f'cell{i}'
+    doc.add_paragraph('Outro')
+    doc.save(str(tmp_path / 'table.docx'))
+    shutil.copy(docx_file, tmp_path / 'plain.docx')
+    (tmp_path / 'broken.docx').write_bytes(b'not a docx')
+
+    report = offline_handler.convert_docx_to_txt(str(tmp_path), jobs=2)
+    assert sorted(report['converted']) == ['plain.docx', 'table.docx']
+    assert list(report['failed']) == ['broken.docx']
+    assert (tmp_path / 'table.txt').read_text(encoding='utf-8') == 'Intro\tend\n\ncell0\tcell1\ncell2\tcell3\nOutro'
+    assert (tmp_path / 'plain.txt').read_text(encoding='utf-8') == offline_handler.docx_to_text(docx_file)
+
+def test_docx_xml_extraction_keeps_text_boxes_out_of_anchor_paragraph(offline_handler, tmp_path):
+    from docx import Document
+    from docx.oxml import parse_xml
+    textbox = (
+        '<w:txbxContent><w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>'
+        '<w:r><w:t>Box text</w:t></w:r></w:p></w:txbxContent>'
+    )
+    run = parse_xml(
+        '<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+        ' xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+        ' xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"'
+        ' xmlns:v="urn:schemas-microsoft-com:vml">'
+        f'<mc:AlternateContent><mc:Choice Requires="wps"><w:drawing><wps:txbx>{textbox}</wps:txbx></w:drawing></mc:Choice>'
+        f'<mc:Fallback><w:pict><v:shape><v:textbox>{textbox}</v:textbox></v:shape></w:pict></mc:Fallback></mc:AlternateContent>'
+        '</w:r>'
+    )
+    doc = Document()
+    paragraph = doc.add_paragraph('Outer text')
+    paragraph._p.append(run)
+    paragraph.add_run(' tail')
+    doc.add_paragraph('After')
+    docx_path = str(tmp_path / 'textbox.docx')
+    doc.save(docx_path)
+
+    text = offline_handler.docx_to_text(docx_path)
+    assert text == 'Outer text tail\nBox text\nAfter'
+    # python-docx leaves text boxes out; everything else matches it
+    assert '\n'.join(line for line in text.split('\n') if line != 'Box text') == offline_handler.docx_to_text(docx_path, method='python-docx')
+
+def test_instrumentation_records_spans_and_counters(mocker, tmp_path):
+    import json
+    from GDriveOps.instrument import Instrumentation, MemorySink, JsonlSink
+    memory = MemorySink()
+    instrumentation = Instrumentation([memory, JsonlSink(str(tmp_path / 'profile.jsonl'))])
+    mocker.patch.object(GoogleDriveHandler, 'create_service', return_value=MagicMock())
+    handler = GoogleDriveHandler(instrumentation=instrumentation)
+    pdf_file = find_file_with_extension('tests/files', '.pdf')
+    page_count = len(list(handler.iter_pdf_pages(pdf_file)))
+
+    handler.convert_pdf_to_text(pdf_file)
+
+    def flaky_stream(file_id, part_path, **kwargs):
+        if not os.path.exists(part_path):
+            open(part_path, 'wb').close()
+            raise ConnectionResetError('reset')
+        with open(part_path, 'ab') as f:
+            f.write(b'x' * 10)
+
+    mocker.patch.object(handler, 'stream_to_file', side_effect=flaky_stream)
+    mocker.patch('GDriveOps.GDhandler.time.sleep')
+    handler.download_file({'id': '1', 'name': 'a.pdf'}, str(tmp_path), verbose=False)
+    with pytest.raises(ValueError):
+        handler.clustering([[0.0]], 1, method='unknown')
+    instrumentation.close()
+
+    summary = instrumentation.summary()
+    assert summary['extract_pdf']['counters']['pages'] == page_count
+    assert summary['download']['counters'] == {'retries': 1, 'bytes': 10}
+    assert summary['cluster']['errors'] == 1
+    assert [event['stage'] for event in memory.events] == ['extract_pdf', 'download', 'cluster']
+    with open(tmp_path / 'profile.jsonl', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == memory.events
+    report = instrumentation.report()
+    assert 'extract_pdf' in report and 'bytes=10' in report
+
+def test_prepare_pdf_text_uses_extraction_cache(mocker, offline_handler, tmp_path):
+    from GDriveOps.cache import ExtractionCache
+    pdf_file = find_file_with_extension('tests/files', '.pdf')
+    mocker.patch.object(offline_handler, 'preprocess_text', side_effect=lambda text: text.lower())
+    with ExtractionCache(str(tmp_path)) as cache:
+        first = offline_handler.prepare_pdf_text(pdf_file, cache=cache)
+        extract = mocker.patch.object(offline_handler, 'extract_text_from_pdf')
+        assert offline_handler.prepare_pdf_text(pdf_file, cache=cache) == first
+        extract.assert_not_called()
+        assert set(cache.stats()['stages']) == {'text', 'sections', 'preprocessed'}
+
+def test_extraction_cache_evicts_least_recently_used(tmp_path):
+    from GDriveOps.cache import ExtractionCache
+    with ExtractionCache(str(tmp_path), max_bytes=25) as cache:
+        cache.put('old', 'text', 'a' * 10)
+        cache.put('recent', 'text', 'b' * 10)
+        cache.get('old')
+        cache.put('new', 'text', 'c' * 10)
+        assert cache.get('recent') is None
+        assert cache.get('old') == 'a' * 10
+
+def test_response_cache_expires_and_evicts(mocker, tmp_path):
+    import time
+    from GDriveOps.cache import ResponseCache
+    with ResponseCache(str(tmp_path), ttl=100, max_bytes=25) as cache:
+        cache.put('gpt-4o', 0, 'prompt', 'chunk a', 'a' * 10)
+        assert cache.get('gpt-4o', 0, 'prompt', 'chunk a') == 'a' * 10
+        assert cache.get('gpt-4o', 0.5, 'prompt', 'chunk a') is None
+        assert cache.get('gpt-4o', 0, 'other prompt', 'chunk a') is None
+        cache.put('gpt-4o', 0, 'prompt', 'chunk b', 'b' * 10)
+        cache.get('gpt-4o', 0, 'prompt', 'chunk a')
+        cache.put('gpt-4o', 0, 'prompt', 'chunk c', 'c' * 10)
+        assert cache.get('gpt-4o', 0, 'prompt', 'chunk b') is None
+
+        now = time.time()
+        mocker.patch('GDriveOps.cache.time.time', return_value=now + 101)
+        assert cache.get('gpt-4o', 0, 'prompt', 'chunk a') is None
+
+def test_embed_chunks_batches_and_caches(mocker, offline_handler, tmp_path):
+    from GDriveOps.cache import EmbeddingCache
+    client = MagicMock()
+    client.embed.side_effect = lambda texts, model, input_type: MagicMock(embeddings=[[float(len(t)), 1.0] for t in texts])
+    client_factory = mocker.patch('GDriveOps.GDhandler.voyageai.Client', return_value=client)
+    chunks = ['a', 'bb', 'ccc', 'dddd', 'eeeee']
+
+    with EmbeddingCache(str(tmp_path)) as cache:
+        vectors = offline_handler.embed_chunks(chunks, 'key', cache=cache, batch_size=2)
+        assert client.embed.call_count == 3
+        assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+        client.embed.reset_mock()
+        again = offline_handler.embed_chunks(chunks[::-1] + ['ffffff'], 'key', cache=cache)
+        assert client.embed.call_count == 1
+        assert client.embed.call_args[0][0] == ['ffffff']
+        assert again[:, 0].tolist() == [5.0, 4.0, 3.0, 2.0, 1.0, 6.0]
+    assert client_factory.call_count == 1
+
+def test_embedding_cache_ignores_uncommitted_bytes(tmp_path):
+    import numpy as np
+    from GDriveOps.cache import EmbeddingCache
+    with EmbeddingCache(str(tmp_path)) as cache:
+        cache.add('model', 'document', ['a'], [[1.0, 1.0]])
+        # Left behind by a writer that died before its SQLite commit
+        with open(cache._data_path('model', 'document'), 'ab') as f:
+            f.write(np.zeros(3, dtype=np.float32).tobytes())
+        cache.add('model', 'document', ['b'], [[2.0, 2.0]])
+        found = cache.lookup('model', 'document', ['a', 'b'])
+        assert found[0].tolist() == [1.0, 1.0]
+        assert found[1].tolist() == [2.0, 2.0]
+        with pytest.raises(ValueError):
+            cache.add('model', 'document', ['c', 'd'], [[3.0, 3.0]])
+
+def test_summarize_pdf_embeds_each_document_once(mocker, offline_handler, word_tokens, tmp_path):
+    import numpy as np
+    text = ' '.join(f'word{i}' for i in range(3000))
+    mocker.patch.object(offline_handler, 'prepare_pdf_text', return_value=(text, text))
+    embed = mocker.patch.object(offline_handler, 'embed_chunks', side_effect=lambda chunks, *args, **kwargs: np.eye(len(chunks)))
+    mocker.patch.object(offline_handler, 'get_model')
+    chain = mocker.patch('GDriveOps.GDhandler.LLMChain').return_value
+    chain.run.return_value = 'summary'
+    offline_handler.rate_limits['groq'] = 60000
+    save = mocker.patch.object(offline_handler, 'save_summary_as_docx')
+
+    summary = offline_handler.summarize_pdf('paper.pdf', str(tmp_path / 'out.docx'), 'llama3-8b-8192', 'prompt', None, None, 'key', chunk_size=2000, chunk_overlap=100)
+    assert embed.call_count == 1
+    assert 'summary' in summary
+    save.assert_called_once()
+
+def test_filter_redundant_chunks_matches_pairwise_reference(offline_handler):
+    import numpy as np
+    from sklearn.metrics.pairwise import cosine_similarity
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(40, 16))
+    vectors = np.vstack([base, base[:20] + rng.normal(scale=0.05, size=(20, 16)), np.zeros((1, 16))])
+    chunks = [f'chunk{i}' for i in range(len(vectors))]
+
+    expected = []
+    for i, vector in enumerate(vectors):
+        if not expected or cosine_similarity([vector], vectors[expected]).max() < 0.8:
+            expected.append(i)
+
+    keep = offline_handler.filter_redundant_indices(vectors, similarity_threshold=0.8, block_size=7)
+    assert keep.tolist() == expected
+    unique_chunks, unique_vectors = offline_handler.filter_redundant_chunks(chunks, vectors)
+    assert unique_chunks == [chunks[i] for i in expected]
+    assert unique_vectors.shape == (len(expected), 16)
+
+@pytest.mark.parametrize('method', ['kmeans', 'minibatch', 'kcenter'])
+def test_clustering_selects_unique_chunks(offline_handler, method):
+    import numpy as np
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(3, 8)) * 10
+    vectors = np.vstack([center + rng.normal(scale=0.01, size=(4, 8)) for center in centers])
+
+    selected = offline_handler.clustering(vectors, 6, method=method, max_threads=1)
+    assert len(selected) == 6
+    assert len(set(selected)) == 6
+    assert selected == sorted(selected)
+
+def test_map_reduce_summary_runs_concurrently_and_reduces(offline_handler, word_tokens):
+    import threading
+    import time
+    from GDriveOps.GDhandler import run_coroutine
+    calls = []
+    active = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    class FakeConversation:
+        def run(self, text):
+            with lock:
+                calls.append(text)
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+            time.sleep(0.05)
+            with lock:
+                active['now'] -= 1
+            return f'summary of {len(text)}'
+
+    offline_handler.rate_limits['openai'] = 60000
+    pieces = ['x' * 100] * 6
+    summary = run_coroutine(offline_handler.map_reduce_summary(FakeConversation(), pieces, 'gpt-4o', token_budget=500, max_concurrency=3))
+    assert active['peak'] == 3
+    assert len(calls) == 7
+    assert calls[-1] == '\n\n'.join(['summary of 100'] * 6)
+    assert summary == f'summary of {len(calls[-1])}'
+
+def test_count_tokens_memoizes_by_digest(mocker, word_tokens):
+    from GDriveOps import GDhandler
+    encode = mocker.spy(GDhandler.get_token_encoder('gpt-4'), 'encode')
+    text = 'one two three'
+    assert GDhandler.count_tokens(text, 'gpt-4') == 3
+    assert GDhandler.count_tokens(text, model='gpt-4') == 3
+    assert encode.call_count == 1
+    assert all(text not in key for key in GDhandler._token_counts)
+
+def test_pack_chunks_fills_token_budget(mocker, offline_handler, word_tokens):
+    from GDriveOps.GDhandler import count_tokens
+    packs = offline_handler.pack_chunks(['a b c', 'd e', 'f g h i'], 'gpt-4', 6)
+    assert packs == ['a b c d e', 'f g h i']
+
+    long_chunk = ' '.join(f'w{i}' for i in range(10))
+    packs = offline_handler.pack_chunks(['x', long_chunk], 'gpt-4', 4)
+    assert all(count_tokens(pack, 'gpt-4') <= 4 for pack in packs)
+    assert ' '.join(packs) == 'x ' + long_chunk
+    assert offline_handler.context_budget('llama3-8b-8192', 'two words') == 8192 - 2 - 1024 - 32
+
+    mocker.patch.object(offline_handler, 'get_model')
+    chain = mocker.patch('GDriveOps.GDhandler.LLMChain').return_value
+    chain.run.return_value = 'summary'
+    text = ' '.join(f'w{i}' for i in range(1000))
+    assert offline_handler.summarize_text(text, 'gpt-4o', 'prompt', None, None, None) == 'summary'
+    chain.run.assert_called_once_with(text)
+
+def test_llm_clients_and_chains_are_reused(mocker, offline_handler):
+    groq = mocker.patch('GDriveOps.GDhandler.ChatGroq')
+    openai = mocker.patch('GDriveOps.GDhandler.ChatOpenAI')
+    chain_factory = mocker.patch('GDriveOps.GDhandler.LLMChain')
+    mocker.patch('GDriveOps.GDhandler.ChatPromptTemplate')
+    offline_handler.llm_timeout = 30
+
+    first = offline_handler.get_chain('llama3-8b-8192', 'prompt', None, 'groq-key')
+    assert offline_handler.get_chain('llama3-8b-8192', 'prompt', None, 'groq-key') is first
+    offline_handler.get_chain('llama3-8b-8192', 'other prompt', None, 'groq-key')
+    offline_handler.get_model('gpt-4o', 'openai-key', None)
+    offline_handler.get_model('gpt-4o', 'openai-key', None)
+
+    assert groq.call_count == 1
+    assert openai.call_count == 1
+    assert chain_factory.call_count == 2
+    assert groq.call_args.kwargs['timeout'] == 30
+    assert groq.call_args.kwargs['http_client'] is openai.call_args.kwargs['http_client']
+    async_client = groq.call_args.kwargs['http_async_client']
+    assert async_client is openai.call_args.kwargs['http_async_client']
+    with pytest.raises(ValueError):
+        offline_handler.get_model('unknown', None, None)
+    http_client = offline_handler.get_http_client()
+    offline_handler.close_llm_clients()
+    assert http_client.is_closed and async_client.is_closed
+
+def test_summarize_text_serves_repeated_calls_from_response_cache(mocker, offline_handler, word_tokens, tmp_path):
+    import numpy as np
+    from GDriveOps.cache import ResponseCache
+    mocker.patch.object(offline_handler, 'get_model')
+    chain = mocker.patch('GDriveOps.GDhandler.LLMChain').return_value
+    chain.run.side_effect = lambda text: f'summary of {len(text.split())} words'
+    offline_handler.rate_limits['groq'] = 60000
+    text = ' '.join(f'w{i}' for i in range(12000))
+
+    with ResponseCache(str(tmp_path)) as cache:
+        first = offline_handler.summarize_text(text, 'llama3-8b-8192', 'prompt', None, None, None, chunks=[text], vectors=np.eye(1), response_cache=cache)
+        calls = chain.run.call_count
+        assert calls > 1
+        again = offline_handler.summarize_text(text, 'llama3-8b-8192', 'prompt', None, None, None, chunks=[text], vectors=np.eye(1), response_cache=cache)
+        assert again == first
+        assert chain.run.call_count == calls
+
+def test_summarize_text_rate_limits_single_piece(mocker, offline_handler, word_tokens):
+    mocker.patch.object(offline_handler, 'get_model')
+    chain = mocker.patch('GDriveOps.GDhandler.LLMChain').return_value
+    chain.run.return_value = 'short summary'
+    wait = mocker.spy(offline_handler.get_rate_limiter('gpt-4o'), 'wait')
+    assert offline_handler.summarize_text('a few words', 'gpt-4o', 'prompt', 'key', None, None) == 'short summary'
+    assert chain.run.call_count == 1
+    assert wait.call_count == 1
+
+def test_summarize_directory_checkpoints_and_resumes(mocker, offline_handler, tmp_path):
+    pdf_dir = tmp_path / 'pdfs'
+    pdf_dir.mkdir()
+    for name in ['a.pdf', 'b.pdf', 'c.pdf']:
+        (pdf_dir / name).write_bytes(b'%PDF')
+    failing = {'b.pdf'}
+
+    def fake_summarize(pdf_path, *args, **kwargs):
+        if os.path.basename(pdf_path) in failing:
+            raise RuntimeError('rate limited')
+        return 'summary'
+
+    summarize = mocker.patch.object(offline_handler, 'summarize_pdf', side_effect=fake_summarize)
+    nltk_data = mocker.patch('GDriveOps.GDhandler.ensure_nltk_data')
+    limits = mocker.patch('GDriveOps.GDhandler.threadpool_limits')
+    progress = []
+    results = offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'gpt-4o', workers=3, use_cache=False, progress_callback=lambda done, total, result: progress.append((done, total)))
+    assert [(r['file'], r['status']) for r in results] == [('a.pdf', 'done'), ('b.pdf', 'failed'), ('c.pdf', 'done')]
+    assert results[1]['error'] == 'rate limited'
+    assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+    assert nltk_data.call_count == 1
+    assert limits.call_count == 1
+    assert summarize.call_args.kwargs['max_threads'] is None
+
+    failing.clear()
+    summarize.reset_mock()
+    results = offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'gpt-4o', workers=3, use_cache=False)
+    assert summarize.call_count == 1
+    assert [r['status'] for r in results] == ['exists', 'done', 'exists']
+
+    # Another model or prompt doesn't reuse the checkpoint
+    summarize.reset_mock()
+    results = offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'llama3', workers=3, use_cache=False)
+    assert summarize.call_count == 3
+    assert results[0]['model'] == 'llama3'
+    summarize.reset_mock()
+    results = offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'llama3', prompt='Summarize briefly.', workers=3, use_cache=False)
+    assert summarize.call_count == 3
+    results = offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'llama3', workers=3, use_cache=False)
+    assert summarize.call_count == 3
+    assert [r['status'] for r in results] == ['exists', 'exists', 'exists']
+
+    # The caches are opened in cache_dir and closed when the run ends
+    from GDriveOps.cache import ExtractionCache, EmbeddingCache, ResponseCache
+    closes = [mocker.spy(store, 'close') for store in (ExtractionCache, EmbeddingCache, ResponseCache)]
+    offline_handler.summarize_directory(str(pdf_dir), str(tmp_path / 'out'), 'gpt-4', workers=3, cache_dir=str(tmp_path / 'cache'))
+    assert summarize.call_args.kwargs['cache'].cache_dir == str(tmp_path / 'cache')
+    assert [close.call_count for close in closes] == [1, 1, 1]
+
+def test_local_actions_skip_drive_authentication(mocker, tmp_path):
+    import sys
+    from GDriveOps import GDhandler
+    create_service = mocker.patch.object(GoogleDriveHandler, 'create_service')
+    process = mocker.patch.object(GoogleDriveHandler, 'process_pdfs_in_dir')
+    mocker.patch.object(sys, 'argv', ['GDhandler', 'convert_pdfs', '--directory', str(tmp_path)])
+    GDhandler.main()
+    assert create_service.call_count == 0
+    assert process.call_count == 1
+    with pytest.raises(RuntimeError):
+        GoogleDriveHandler(connect=False).get_service()
+
+    summarize = mocker.patch.object(GoogleDriveHandler, 'summarize_directory', return_value=[])
+    mocker.patch.object(sys, 'argv', ['GDhandler', 'summarize_pdfs', '--directory', str(tmp_path), '--cache-dir', str(tmp_path / 'cache')])
+    GDhandler.main()
+    assert summarize.call_args.kwargs['cache_dir'] == str(tmp_path / 'cache')
+
+    mocker.patch.object(sys, 'argv', ['GDhandler', 'download_pdfs'])
+    with pytest.raises(SystemExit):
+        GDhandler.main()
+    assert create_service.call_count == 0
+
+def test_ensure_nltk_data_loads_wordnet_once_across_threads(mocker):
+    import threading
+    from GDriveOps import GDhandler
+    nltk = mocker.patch.object(GDhandler, 'nltk')
+    mocker.patch.object(GDhandler, '_nltk_ready', False)
+    mocker.patch.object(GDhandler, '_lemmatizer', None)
+    lemmatizer = mocker.patch('GDriveOps.GDhandler.WordNetLemmatizer')
+    threads = [threading.Thread(target=GDhandler.get_lemmatizer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert nltk.corpus.wordnet.ensure_loaded.call_count == 1
+    assert lemmatizer.call_count == 1
+
+def test_preprocess_text_memoizes_lemmas(mocker, offline_handler):
+    from GDriveOps import GDhandler
+    mocker.patch('GDriveOps.GDhandler.ensure_nltk_data')
+    lemmatizer = MagicMock()
+    lemmatizer.lemmatize.side_effect = lambda word: word.rstrip('s')
+    mocker.patch('GDriveOps.GDhandler.WordNetLemmatizer', return_value=lemmatizer)
+    mocker.patch.object(GDhandler, '_lemmatizer', None)
+    GDhandler.lemmatize_word.cache_clear()
+
+    text = 'Cats chase cats; 42 dogs chase CATS. Dogs-2 rest!'
+    assert offline_handler.preprocess_text(text, tokenizer='regex') == 'cat chase cat dog chase cat dog rest'
+    assert lemmatizer.lemmatize.call_count == 4
+    assert offline_handler.preprocess_texts([text, 'cats'], tokenizer='regex')[1] == 'cat'
+    GDhandler.lemmatize_word.cache_clear()
+
+PREPROCESS_CORPUS = [
+    "Patients with Type 2 diabetes were enrolled in 2019. Glucose levels fell by 12%!",
+    "The trials' results weren't conclusive; follow-up studies are ongoing (n=340).",
+    "Methods:\nWe measured HbA1c, insulin and blood pressures.\n\nDoctors' notes were excluded.",
+    "",
+]
+
+def nltk_data_available():
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        return False
+    return True
+
+class StandInLemmatizer:
+    def lemmatize(self, word):
+        return word[:-1] if word.endswith('s') and len(word) > 3 else word
+
+@pytest.fixture(params=['nltk', 'stand-in'])
+def nltk_backend(request, mocker):
+    # 'nltk' needs the punkt and wordnet data installed; 'stand-in' swaps
+    # the tokenizers and lemmatizer for simple deterministic ones, so the
+    # surrounding pipeline is compared either way
+    import re
+    from GDriveOps import GDhandler
+    if request.param == 'nltk':
+        if not nltk_data_available():
+            pytest.skip('NLTK punkt/wordnet data not installed')
+    else:
+        mocker.patch('nltk.sent_tokenize', side_effect=lambda text: [s for s in re.split(r'(?<=[.!?])\s+', text) if s])
+        mocker.patch('nltk.word_tokenize', side_effect=lambda sent: re.findall(r"\w+|[^\w\s]", sent))
+        mocker.patch('benchmarks.bench_preprocess.WordNetLemmatizer', StandInLemmatizer)
+        mocker.patch.object(GDhandler, '_lemmatizer', StandInLemmatizer())
+        mocker.patch.object(GDhandler, '_nltk_ready', True)
+    GDhandler.lemmatize_word.cache_clear()
+    yield request.param
+    GDhandler.lemmatize_word.cache_clear()
+
+def test_preprocess_text_matches_reference_implementation(offline_handler, nltk_backend):
+    from benchmarks.bench_preprocess import reference_preprocess
+    expected = [reference_preprocess(text) for text in PREPROCESS_CORPUS]
+    assert [offline_handler.preprocess_text(text) for text in PREPROCESS_CORPUS] == expected
+    assert offline_handler.preprocess_texts(PREPROCESS_CORPUS) == expected
+
+def test_preprocess_texts_in_worker_processes(offline_handler, nltk_backend):
+    import multiprocessing
+    if nltk_backend == 'stand-in' and multiprocessing.get_start_method() != 'fork':
+        pytest.skip('the stand-ins only reach worker processes through fork')
+    expected = offline_handler.preprocess_texts(PREPROCESS_CORPUS * 3)
+    assert offline_handler.preprocess_texts(PREPROCESS_CORPUS * 3, jobs=2, chunksize=2) == expected
+    assert offline_handler.preprocess_texts(PREPROCESS_CORPUS, tokenizer='regex', jobs=2) == offline_handler.preprocess_texts(PREPROCESS_CORPUS, tokenizer='regex')
+
+def test_extract_sections_uses_heading_lines(offline_handler):
+    text = (
+        "Abstract\nWe report results of a trial.\n"
+        "2. Materials and Methods\nStatistical methods were used.\n"
+        "Results\nGlucose fell.\n"
+        "IV. Discussion\nThese results suggest...\nResults\nstill discussion\n"
+        "Conclusions:\nIt works.\n"
+        "References\n[1] Someone.\n"
+    )
+    combined, sections = offline_handler.extract_sections(text)
+    assert sections['methodology'] == "2. Materials and Methods\nStatistical methods were used.\n"
+    assert sections['results'] == "Results\nGlucose fell.\n"
+    assert sections['discussion'].endswith("Results\nstill discussion\n")
+    assert sections['conclusion'] == "Conclusions:\nIt works.\n"
+    assert combined == ''.join(sections[name] for name in ['methodology', 'results', 'discussion', 'conclusion'])
+    assert 'Someone' not in combined and 'Abstract' not in combined
+
+    _, custom = offline_handler.extract_sections(text, headings={'intro': ['abstract']}, stop_headings=['materials and methods'])
+    assert custom['intro'] == "Abstract\nWe report results of a trial.\n"
 
 def test_docx_to_text(handler):
     docx_file = find_file_with_extension('tests/files', '.docx')
@@ -52,10 +613,295 @@ def test_convert_docx_to_txt(mocker, handler):
     mocker.patch('GDriveOps.GDhandler.os.listdir', return_value=[docx_name])
     mocker.patch.object(handler, 'docx_to_text', return_value='Sample text from DOCX')
 
+    replace = mocker.patch('GDriveOps.GDhandler.os.replace')
+    output_path = os.path.join('tests/files', txt_file)
+
     with patch('builtins.open', mock_open()) as mock_file:
         handler.convert_docx_to_txt('tests/files')
         handler.docx_to_text.assert_called_with(docx_file)
-        mock_file.assert_called_with(os.path.join('tests/files', txt_file), 'w', encoding='utf-8')
+        mock_file.assert_called_with(output_path + '.tmp', 'w', encoding='utf-8')
+        mock_file().write.assert_called_with('Sample text from DOCX')
+        replace.assert_called_with(output_path + '.tmp', output_path)
+
+def test_download_and_upload_round_trip_with_fake_drive(handler, drive, tmp_path):
+    for i in range(25):
+        drive.add_file('pdfs', f'paper{i}.pdf', bytes([i]) * (1000 + i), mime_type='application/pdf')
+    drive.add_file('pdfs', 'notes.txt', b'not a pdf', mime_type='text/plain')
+
+    results = handler.download_pdfs('pdfs', save_dir=str(tmp_path), workers=4, chunk_size=256)
+    assert sorted(results['downloaded']) == sorted(item['id'] for item in drive.query("'pdfs' in parents") if item['name'] != 'notes.txt')
+    assert (tmp_path / 'paper7.pdf').read_bytes() == bytes([7]) * 1007
+    assert drive.bytes_served == sum(1000 + i for i in range(25))
+
+    (tmp_path / 'a.txt').write_text('alpha', encoding='utf-8')
+    results = handler.upload_txt('texts', directory_path=str(tmp_path), workers=2)
+    assert list(results['uploaded']) == ['a.txt']
+    assert [item['content'] for item in drive.query("'texts' in parents")] == [b'alpha']
+
+def test_download_items_isolates_failures(mocker, offline_handler, tmp_path):
+    items = [{'id': str(i), 'name': f'file{i}.pdf'} for i in range(8)]
+
+    def fake_download(item, save_dir, **kwargs):
+        if item['name'] == 'file3.pdf':
+            raise IOError('boom')
+        return True
+
+    mocker.patch.object(offline_handler, 'download_file', side_effect=fake_download)
+    results = offline_handler.download_items(items, str(tmp_path), workers=4)
+    assert sorted(results['downloaded']) == sorted(i['id'] for i in items if i['name'] != 'file3.pdf')
+    assert list(results['failed']) == ['3']
+
+def test_download_items_keeps_first_of_same_named_files(handler, drive, tmp_path):
+    first = drive.add_file('folder', 'paper.pdf', b'first' * 100, mime_type='application/pdf')
+    second = drive.add_file('folder', 'paper.pdf', b'second' * 100, mime_type='application/pdf')
+    drive.add_file('folder', 'other.pdf', b'other', mime_type='application/pdf')
+
+    items = list(handler.iter_folder('folder'))
+    results = handler.download_items(items, str(tmp_path), workers=4, chunk_size=16)
+    assert second['id'] in results['skipped']
+    assert first['id'] in results['downloaded']
+    assert (tmp_path / 'paper.pdf').read_bytes() == b'first' * 100
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['other.pdf', 'paper.pdf']
+
+def test_download_file_resumes_only_matching_partial_file(handler, drive, tmp_path):
+    import json
+    drive.add_file('folder', 'paper.pdf', b'abcdef', mime_type='application/pdf')
+    item = next(handler.iter_folder('folder'))
+    part = tmp_path / f"paper.pdf.{item['id']}.part"
+    meta = tmp_path / f"paper.pdf.{item['id']}.part.json"
+    version = {key: item[key] for key in ('id', 'size', 'md5Checksum', 'modifiedTime')}
+
+    part.write_bytes(b'abc')
+    meta.write_text(json.dumps(version), encoding='utf-8')
+    assert handler.download_file(item, str(tmp_path), verbose=False, chunk_size=2)
+    assert (tmp_path / 'paper.pdf').read_bytes() == b'abcdef'
+    assert drive.bytes_served == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['paper.pdf']
+
+    # A part left by an older version of the file is discarded
+    part.write_bytes(b'old')
+    meta.write_text(json.dumps(dict(version, md5Checksum='old')), encoding='utf-8')
+    assert handler.download_file(item, str(tmp_path), verbose=False, overwrite=True)
+    assert (tmp_path / 'paper.pdf').read_bytes() == b'abcdef'
+    assert drive.bytes_served == 9
+
+    # A complete part is renamed without asking for a range past the end
+    part.write_bytes(b'abcdef')
+    meta.write_text(json.dumps(version), encoding='utf-8')
+    assert handler.download_file(item, str(tmp_path), verbose=False, overwrite=True)
+    assert drive.bytes_served == 9
+
+    drive.replace_content(item['id'], b'changed!')
+    with pytest.raises(ValueError):
+        handler.download_file(item, str(tmp_path), verbose=False, overwrite=True)
+    assert not part.exists()
+
+def test_download_file_retries_only_transient_errors(mocker, offline_handler, tmp_path):
+    from httplib2 import Response
+    from googleapiclient.errors import HttpError
+    sleep = mocker.patch('GDriveOps.GDhandler.time.sleep')
+    stream = mocker.patch.object(offline_handler, 'stream_to_file', side_effect=HttpError(Response({'status': 404}), b''))
+    with pytest.raises(HttpError):
+        offline_handler.download_file({'id': '1', 'name': 'a.pdf'}, str(tmp_path), verbose=False)
+    assert stream.call_count == 1
+
+    errors = [HttpError(Response({'status': 503}), b''), ConnectionResetError('reset')]
+
+    def flaky_stream(file_id, part_path, **kwargs):
+        open(part_path, 'ab').close()
+        if errors:
+            raise errors.pop(0)
+
+    stream.side_effect = flaky_stream
+    stream.reset_mock()
+    assert offline_handler.download_file({'id': '2', 'name': 'b.pdf'}, str(tmp_path), verbose=False)
+    assert stream.call_count == 3
+    first, second = (call.args[0] for call in sleep.call_args_list)
+    assert 1 <= first < 2 <= second < 3
+
+def test_sync_folder_only_downloads_changed_files(mocker, handler, drive, tmp_path):
+    from GDriveOps.manifest import SyncManifest
+    unchanged = drive.add_file('folder', 'a.pdf', b'old', mime_type='application/pdf')
+    changed = drive.add_file('folder', 'b.pdf', b'new', mime_type='application/pdf')
+    drive.add_file('folder', 'notes.txt', b'text', mime_type='text/plain')
+    # Already on disk from a run before the manifest existed
+    (tmp_path / 'a.pdf').write_bytes(b'old')
+    download = mocker.spy(handler, 'download_items')
+
+    handler.download_pdfs('folder', save_dir=str(tmp_path), sync=True)
+    assert [item['id'] for item in download.call_args[0][0]] == [changed['id']]
+    assert (tmp_path / 'b.pdf').read_bytes() == b'new'
+
+    # The second run is driven by the Changes API from the saved token
+    drive.replace_content(unchanged['id'], b'edited')
+    list_calls = drive.calls['list']
+    handler.download_pdfs('folder', save_dir=str(tmp_path), sync=True)
+    assert [item['id'] for item in download.call_args[0][0]] == [unchanged['id']]
+    assert drive.calls['list'] == list_calls
+    assert (tmp_path / 'a.pdf').read_bytes() == b'edited'
+    with SyncManifest(str(tmp_path)) as manifest:
+        assert manifest.get_state('start_page_token:folder') == str(len(drive.change_log))
+
+def test_get_folder_index_paginates_and_caches(handler, drive):
+    drive.max_page_size = 1
+    drive.add_file('folder', 'a.txt', b'x')
+    drive.add_file('folder', 'b.txt', b'y')
+
+    index = handler.get_folder_index('folder', ttl=60)
+    assert set(index['by_name']) == {'a.txt', 'b.txt'}
+    assert index['by_md5'][drive.query("name='b.txt'")[0]['md5Checksum']]['name'] == 'b.txt'
+    assert handler.get_folder_index('folder', ttl=60) is index
+    assert drive.calls['list'] == 2
+
+def test_iter_folder_recurses_and_streams_downloads(handler, drive, tmp_path):
+    drive.max_page_size = 2
+    for i in range(3):
+        drive.add_file('root', f'top{i}.pdf', b'top', mime_type='application/pdf')
+    sub = drive.add_folder('root', 'sub')
+    nested = drive.add_folder(sub['id'], 'nested')
+    inner = drive.add_file(sub['id'], 'inner.pdf', b'inner', mime_type='application/pdf')
+    deep = drive.add_file(nested['id'], 'deep.pdf', b'deep', mime_type='application/pdf')
+    drive.add_file(nested['id'], 'skip.txt', b'txt', mime_type='text/plain')
+
+    items = handler.iter_folder('root', mime_types=['application/pdf'])
+    assert not isinstance(items, list)
+    assert sorted(item['name'] for item in items) == ['top0.pdf', 'top1.pdf', 'top2.pdf']
+    item = next(handler.iter_folder('root'))
+    assert set(item) == {'id', 'name', 'size', 'md5Checksum', 'mimeType', 'modifiedTime'}
+
+    results = handler.download_pdfs('root', save_dir=str(tmp_path), recursive=True, workers=3)
+    top = [item['id'] for item in drive.query("'root' in parents") if item['name'].startswith('top')]
+    assert sorted(results['downloaded']) == sorted(top + [inner['id'], deep['id']])
+    assert (tmp_path / 'sub' / 'nested' / 'deep.pdf').read_bytes() == b'deep'
+
+    results = handler.download_pdfs('root', save_dir=str(tmp_path / 'limited'), limit=2)
+    assert len(results['downloaded']) == 2
+    with pytest.raises(ValueError):
+        handler.download_pdfs('root', save_dir=str(tmp_path), recursive=True, sync=True)
+
+def test_download_keeps_drive_names_inside_save_dir(handler, drive, tmp_path):
+    save_dir = tmp_path / 'save'
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    dotdot = drive.add_folder('root', '..')
+    evil = drive.add_file(dotdot['id'], 'evil.pdf', b'1', mime_type='application/pdf')
+    up = drive.add_file('root', '../up.pdf', b'2', mime_type='application/pdf')
+    absolute = drive.add_file('root', '/abs.pdf', b'3', mime_type='application/pdf')
+    link = drive.add_folder('root', 'link')
+    linked = drive.add_file(link['id'], 'linked.pdf', b'4', mime_type='application/pdf')
+    save_dir.mkdir()
+    os.symlink(outside, save_dir / 'link')
+
+    results = handler.download_pdfs('root', save_dir=str(save_dir), recursive=True)
+    assert sorted(results['downloaded']) == sorted([evil['id'], up['id'], absolute['id']])
+    assert list(results['failed']) == [linked['id']]
+    assert (save_dir / '.._up.pdf').read_bytes() == b'2'
+    assert (save_dir / '__' / 'evil.pdf').read_bytes() == b'1'
+    assert list(outside.iterdir()) == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['outside', 'save']
+
+def test_iter_folder_batches_subfolder_listings(handler, drive):
+    for i in range(150):
+        sub = drive.add_folder('root', f'sub{i}')
+        drive.add_file(sub['id'], f'paper{i}.pdf', b'x', mime_type='application/pdf')
+
+    items = list(handler.iter_folder('root', mime_types=['application/pdf'], recursive=True))
+    assert sorted(item['name'] for item in items) == sorted(f'paper{i}.pdf' for i in range(150))
+    assert items[0]['folder_path'] == 'sub0'
+    # 150 subfolders are listed in two round trips instead of 150
+    assert drive.calls['batch'] == 2
+
+def test_get_metadata_batches_lookups(handler, drive):
+    ids = [drive.add_file('folder', f'{i}.txt', b'x')['id'] for i in range(250)]
+
+    metadata = handler.get_metadata(ids + ['missing'], fields='id, name')
+    assert drive.calls['batch'] == 3
+    assert metadata[ids[42]] == {'id': ids[42], 'name': '42.txt'}
+    assert metadata['missing'] is None
+    assert handler.instrumentation.summary()['batch']['counters']['calls'] == 251
+
+def test_metadata_batch_resends_rate_limited_calls(mocker, drive):
+    from httplib2 import Response
+    from googleapiclient.errors import HttpError
+    from GDriveOps.batch import MetadataBatch
+    from GDriveOps.instrument import Instrumentation
+    from tests.fake_drive import FakeRequest
+    sleep = mocker.patch('GDriveOps.batch.time.sleep')
+    failures = {'b': 2}
+
+    def answer(name):
+        def run():
+            if failures.get(name):
+                failures[name] -= 1
+                raise HttpError(Response({'status': 429}), b'rate limited')
+            return name
+        return FakeRequest(drive, run)
+
+    instrumentation = Instrumentation()
+    batch = MetadataBatch(drive, instrumentation=instrumentation)
+    for name in ['a', 'b', 'c']:
+        batch.add(answer(name))
+    assert batch.execute() == ['a', 'b', 'c']
+    assert drive.calls['batch'] == 3
+    assert sleep.call_count == 2
+    assert instrumentation.summary()['batch']['counters']['retries'] == 2
+
+def test_sync_uploads_verifies_checksums_in_batches(handler, drive, tmp_path):
+    from GDriveOps.manifest import SyncManifest
+    for name in ['a.txt', 'b.txt', 'c.txt']:
+        (tmp_path / name).write_text(name, encoding='utf-8')
+
+    results = handler.upload_txt('texts', directory_path=str(tmp_path), sync=True, workers=3)
+    assert sorted(results['uploaded']) == ['a.txt', 'b.txt', 'c.txt']
+    assert drive.calls['batch'] == 1
+    with SyncManifest(str(tmp_path)) as manifest:
+        assert manifest.get_upload('texts', 'a.txt')['id'] == results['uploaded']['a.txt']
+
+    # A copy that doesn't match the local file is reported as failed
+    drive.replace_content(results['uploaded']['b.txt'], b'corrupted')
+    verified = handler.verify_uploads({'uploaded': dict(results['uploaded']), 'failed': {}}, str(tmp_path))
+    assert sorted(verified['uploaded']) == ['a.txt', 'c.txt']
+    assert 'checksum mismatch' in verified['failed']['b.txt']
+
+def test_sync_uploads_recreates_deleted_or_trashed_files(handler, drive, tmp_path):
+    from GDriveOps.manifest import SyncManifest
+    for name in ['a.txt', 'b.txt', 'c.txt']:
+        (tmp_path / name).write_text(name, encoding='utf-8')
+    first = handler.upload_txt('texts', directory_path=str(tmp_path), sync=True)['uploaded']
+
+    del drive.files_by_id[first['a.txt']]
+    drive.files_by_id[first['b.txt']]['trashed'] = True
+    for name in ['a.txt', 'b.txt', 'c.txt']:
+        (tmp_path / name).write_text(name + ' edited', encoding='utf-8')
+    results = handler.upload_txt('texts', directory_path=str(tmp_path), sync=True)
+    assert not results['failed']
+    assert results['uploaded']['c.txt'] == first['c.txt']
+    assert results['uploaded']['a.txt'] != first['a.txt']
+    assert results['uploaded']['b.txt'] != first['b.txt']
+    assert sorted(item['content'] for item in drive.query("'texts' in parents")) == [b'a.txt edited', b'b.txt edited', b'c.txt edited']
+    with SyncManifest(str(tmp_path)) as manifest:
+        assert manifest.get_upload('texts', 'b.txt')['id'] == results['uploaded']['b.txt']
+
+def test_upload_docs_parallel_with_inferred_mimetype(mocker, offline_handler, tmp_path):
+    for name in ['a.docx', 'b.docx', 'c.docx']:
+        (tmp_path / name).write_bytes(b'content')
+    mocker.patch.object(offline_handler, 'get_folder_index', return_value={'by_name': {'c.docx': {'id': 'c'}}, 'by_md5': {}})
+    media = mocker.patch('GDriveOps.GDhandler.MediaFileUpload')
+    mocker.patch.object(offline_handler, 'execute_upload', return_value={'id': 'new'})
+
+    results = offline_handler.upload_docs('folder', directory_path=str(tmp_path), workers=2)
+    assert sorted(results['uploaded']) == ['a.docx', 'b.docx']
+    assert media.call_count == 2
+    assert media.call_args.kwargs['mimetype'] == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def test_get_service_is_per_thread(offline_handler):
+    import threading
+    services = []
+    worker = threading.Thread(target=lambda: services.append(offline_handler.get_service()))
+    worker.start()
+    worker.join()
+    assert offline_handler.get_service() is offline_handler.service
+    assert services[0] is not offline_handler.service
 
 if __name__ == '__main__':
     pytest.main()
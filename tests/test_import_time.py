@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+# Generous enough for slow CI machines; a regression that pulls the ML stack
+# back in at import time costs several seconds.
+IMPORT_BUDGET_SECONDS = 3.0
+HEAVY_MODULES = ['langchain', 'langchain_core', 'openai', 'groq', 'voyageai', 'sklearn', 'nltk', 'numpy', 'rouge_score', 'ipywidgets', 'IPython']
+
+def measure_import():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import GDriveOps.GDhandler\n"
+        "print('seconds=%f' % (time.perf_counter() - start))\n"
+        f"print('loaded=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    values = dict(line.split('=', 1) for line in output.splitlines() if line.startswith(('seconds=', 'loaded=')))
+    return float(values['seconds']), [m for m in values['loaded'].split(',') if m]
+
+def test_import_does_not_load_ml_stack():
+    seconds, loaded = measure_import()
+    assert loaded == []
+    assert seconds < IMPORT_BUDGET_SECONDS